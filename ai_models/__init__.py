@@ -0,0 +1,8 @@
+import os
+
+# Load .env once for every module in the package. Deployments (Vercel) set real
+# environment variables and ship no .env, so python-dotenv isn't even imported there.
+_ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
@@ -1,99 +1,110 @@
-import requests
 import json
 import os
+from ai_models import fastjson, upstream
+from ai_models.metrics import timed
 
 # User's Gemini API Key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = "gemini-flash-latest"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
 
-def get_health_advice(env: dict) -> dict:
-    """
-    Generates comprehensive health analysis and daily plans using Google Gemini 1.5 Flash.
-    Returns a dictionary with 'assessment', 'morning_plan', 'afternoon_plan', 'evening_plan'.
+def _gemini_url() -> str:
+    # We use 'gemini-flash-latest' as it is the currently verified working model alias.
+    # 'gemini-1.5-flash' returned 404.
+    return f"{GEMINI_BASE_URL}/v1beta/models/gemini-flash-latest:generateContent?key={GEMINI_API_KEY}"
+
+def _gemini_text(result_json: dict) -> str:
+    """Extracts the model's text, without ```json fences."""
+    text_content = result_json['candidates'][0]['content']['parts'][0]['text']
+    return text_content.replace('```json', '').replace('```', '').strip()
+
+def _advice_request(env: dict) -> tuple:
+    """Returns (payload, aqi, risk_level) for the health advice prompt."""
+    # Determine Risk Level Logic (Synced with UI)
+    aqi = env.get('aqi', 0)
+    risk_level = "Good"
+    if aqi > 150: risk_level = "Hazardous"
+    elif aqi > 100: risk_level = "Unhealthy"
+    elif aqi > 50: risk_level = "Moderate"
+    else: risk_level = "Good"
+    
+    location_context = f"{env.get('city', 'Unknown')}, {env.get('state', '')} {env.get('country', '')}".strip()
+
+    prompt = f"""
+    **Context:**
+    You are an expert environmental health scientist acting as a personal advisor for a user in **{location_context}**.
+    
+    **Real-Time Data:**
+    - AQI: {aqi} (Status: {risk_level})
+    - Location: {location_context}
+    - Temperature: {env.get('temperature')}°C
+    - Humidity: {env.get('humidity')}%
+    - Pollutants: {env.get('pollutants')}
+    
+    **CRITICAL CONSTRAINTS:**
+    1. **CONSISTENCY**: You MUST accept the AQI is {aqi} ({risk_level}).
+    2. **TONE**: Professional, empathetic, and concise. Avoid alarmist language but be firm.
+    3. **FORMAT**: Return ONLY valid JSON.
+    4. **NO REPETITION**: The user already sees the AQI number and "Hazardous/Good" status in the header.
+    5. **LOCAL SPECIFICITY**: Use the location ({location_context}) to infer specific pollution sources (e.g. if hill station: "Forest fires/Tourism/Solid waste"; if city: "Traffic/Industrial"). Tailor advice to the specific geography (e.g. "Avoid valley floor" vs "Avoid main roads").
+    
+    **JSON Structure Required:**
+    {{
+        "assessment": "A deep, 3-paragraph scientific analysis... Mention specific risks... Focus on the specific location context.",
+        "morning_plan": "Specific, actionable advice for the Morning...",
+        "afternoon_plan": "Specific advice for Afternoon...",
+        "evening_plan": "Specific advice for Evening...",
+        "sources": ["List", "of", "likely", "pollutant", "sources", "based", "on", "{location_context}"],
+        "source_narrative": "A 2-sentence explanation of WHY pollution is high in {location_context} (e.g. 'Inversions in the valley...')."
+    }}
     """
-    # API URL for Google Gemini (AI Model)
-    try:
-        # We use 'gemini-flash-latest' as it is the currently verified working model alias.
-        # 'gemini-1.5-flash' returned 404.
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-latest:generateContent?key={GEMINI_API_KEY}"
-        
-        # Headers tell the server we are sending JSON data
-        headers = {
-            "Content-Type": "application/json"
+    
+    payload = {
+        "contents": [{
+            "parts": [{"text": prompt}]
+        }],
+        "generationConfig": {
+            "responseMimeType": "application/json"
         }
-        
-        # Determine Risk Level Logic (Synced with UI)
-        aqi = env.get('aqi', 0)
-        risk_level = "Good"
-        if aqi > 150: risk_level = "Hazardous"
-        elif aqi > 100: risk_level = "Unhealthy"
-        elif aqi > 50: risk_level = "Moderate"
-        else: risk_level = "Good"
-        
-        location_context = f"{env.get('city', 'Unknown')}, {env.get('state', '')} {env.get('country', '')}".strip()
+    }
+    return payload, aqi, risk_level
 
-        prompt = f"""
-        **Context:**
-        You are an expert environmental health scientist acting as a personal advisor for a user in **{location_context}**.
-        
-        **Real-Time Data:**
-        - AQI: {aqi} (Status: {risk_level})
-        - Location: {location_context}
-        - Temperature: {env.get('temperature')}°C
-        - Humidity: {env.get('humidity')}%
-        - Pollutants: {env.get('pollutants')}
-        
-        **CRITICAL CONSTRAINTS:**
-        1. **CONSISTENCY**: You MUST accept the AQI is {aqi} ({risk_level}).
-        2. **TONE**: Professional, empathetic, and concise. Avoid alarmist language but be firm.
-        3. **FORMAT**: Return ONLY valid JSON.
-        4. **NO REPETITION**: The user already sees the AQI number and "Hazardous/Good" status in the header.
-        5. **LOCAL SPECIFICITY**: Use the location ({location_context}) to infer specific pollution sources (e.g. if hill station: "Forest fires/Tourism/Solid waste"; if city: "Traffic/Industrial"). Tailor advice to the specific geography (e.g. "Avoid valley floor" vs "Avoid main roads").
-        
-        **JSON Structure Required:**
-        {{
-            "assessment": "A deep, 3-paragraph scientific analysis... Mention specific risks... Focus on the specific location context.",
-            "morning_plan": "Specific, actionable advice for the Morning...",
-            "afternoon_plan": "Specific advice for Afternoon...",
-            "evening_plan": "Specific advice for Evening...",
-            "sources": ["List", "of", "likely", "pollutant", "sources", "based", "on", "{location_context}"],
-            "source_narrative": "A 2-sentence explanation of WHY pollution is high in {location_context} (e.g. 'Inversions in the valley...')."
-        }}
-        """
+def _parse_advice(status: int, result_json: dict, env: dict, aqi, risk_level: str) -> dict:
+    if status != 200 or result_json is None:
+        return _get_fallback_advice(env)
+    try:
+        parsed_data = fastjson.loads(_gemini_text(result_json))
         
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "responseMimeType": "application/json"
-            }
-        }
+        # Helper to safely add header
+        header = f"### Current Status: AQI {aqi} ({risk_level})\n"
+        if "assessment" in parsed_data:
+             parsed_data["assessment"] = header + parsed_data["assessment"]
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        return parsed_data
         
-        if response.status_code != 200:
-            return _get_fallback_advice(risk_level)
-            
-        result_json = response.json()
-        try:
-            # Extract text
-            text_content = result_json['candidates'][0]['content']['parts'][0]['text']
-            # Clean comments like ```json ... ```
-            clean_text = text_content.replace('```json', '').replace('```', '').strip()
-            
-            parsed_data = json.loads(clean_text)
-            
-            # Helper to safely add header
-            header = f"### Current Status: AQI {aqi} ({risk_level})\n"
-            if "assessment" in parsed_data:
-                 parsed_data["assessment"] = header + parsed_data["assessment"]
-            
-            return parsed_data
-            
-        except (KeyError, json.JSONDecodeError, IndexError) as e:
-            return _get_fallback_advice(risk_level)
+    except (KeyError, json.JSONDecodeError, IndexError, TypeError) as e:
+        return _get_fallback_advice(env)
+
+@timed("advisory.get_health_advice")
+def get_health_advice(env: dict) -> dict:
+    """
+    Generates comprehensive health analysis and daily plans using Google Gemini 1.5 Flash.
+    Returns a dictionary with 'assessment', 'morning_plan', 'afternoon_plan', 'evening_plan'.
+    """
+    try:
+        payload, aqi, risk_level = _advice_request(env)
+        status, result_json = upstream.post_json("gemini", _gemini_url(), payload, timeout=30)
+        return _parse_advice(status, result_json, env, aqi, risk_level)
+    except Exception as e:
+        return _get_fallback_advice(env)
 
+@timed("advisory.get_health_advice")
+async def aget_health_advice(env: dict) -> dict:
+    """Async get_health_advice."""
+    try:
+        payload, aqi, risk_level = _advice_request(env)
+        status, result_json = await upstream.apost_json("gemini", _gemini_url(), payload, timeout=30)
+        return _parse_advice(status, result_json, env, aqi, risk_level)
     except Exception as e:
         return _get_fallback_advice(env)
 
@@ -118,10 +129,7 @@ except ImportError:
     EMERGENCY_DATA = {}
     COUNTRY_DEFAULTS = {}
 
-def get_emergency_info(city: str, country: str) -> dict:
-    """
-    Fetches emergency contact numbers. Uses local data first, then Relevance AI.
-    """
+def _local_emergency_info(city: str, country: str):
     # 1. Check Local City Data
     if city in EMERGENCY_DATA:
         return EMERGENCY_DATA[city]
@@ -129,59 +137,78 @@ def get_emergency_info(city: str, country: str) -> dict:
     # 2. Check Local Country Data (if city not found)
     if country in COUNTRY_DEFAULTS:
         return COUNTRY_DEFAULTS[country]
+    return None
+
+def _emergency_payload(city: str, country: str) -> dict:
+    prompt = f"""
+    **Task:**
+    Provide the emergency contact numbers for **{city}, {country}**.
+    
+    **Required Output Format (JSON):**
+    {{
+        "ambulance": "Phone Number",
+        "police": "Phone Number",
+        "general": "Phone Number (e.g. 911, 112)",
+        "notes": "Brief 1-sentence advice specific to this location."
+    }}
+    
+    **Constraints:**
+    - Return ONLY valid JSON.
+    - If specific city numbers aren't found, use National numbers for {country}.
+    """
+    
+    return {
+        "contents": [{
+            "parts": [{"text": prompt}]
+        }],
+        "generationConfig": {
+            "responseMimeType": "application/json"
+        }
+    }
+
+def _parse_emergency(status: int, result_json: dict) -> dict:
+    # Check status manually to avoid crashing on 4xx/5xx
+    if status != 200:
+         raise Exception(f"Gemini API Error: {status}")
+    try:
+        return fastjson.loads(_gemini_text(result_json))
+    except Exception:
+        # If parsing fails, use fallback below
+         raise Exception("Gemini parsing failed")
+
+# Fallback to International Default
+DEFAULT_EMERGENCY_INFO = {
+    "ambulance": "112", 
+    "police": "112", 
+    "general": "112", 
+    "notes": "Could not fetch local numbers. Dial 112 for international emergency."
+}
+
+@timed("advisory.get_emergency_info")
+def get_emergency_info(city: str, country: str) -> dict:
+    """
+    Fetches emergency contact numbers. Uses local data first, then Google Gemini.
+    """
+    local = _local_emergency_info(city, country)
+    if local:
+        return local
 
     # 3. Use Google Gemini as Fallback
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-latest:generateContent?key={GEMINI_API_KEY}"
-        
-        headers = {"Content-Type": "application/json"}
-        
-        prompt = f"""
-        **Task:**
-        Provide the emergency contact numbers for **{city}, {country}**.
-        
-        **Required Output Format (JSON):**
-        {{
-            "ambulance": "Phone Number",
-            "police": "Phone Number",
-            "general": "Phone Number (e.g. 911, 112)",
-            "notes": "Brief 1-sentence advice specific to this location."
-        }}
-        
-        **Constraints:**
-        - Return ONLY valid JSON.
-        - If specific city numbers aren't found, use National numbers for {country}.
-        """
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "responseMimeType": "application/json"
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-        # Check status manually to avoid crashing on 4xx/5xx
-        if response.status_code != 200:
-             raise Exception(f"Gemini API Error: {response.status_code}")
-             
-        result_json = response.json()
-        
-        try:
-            text_content = result_json['candidates'][0]['content']['parts'][0]['text']
-            clean_text = text_content.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
-        except Exception:
-            # If parsing fails, use fallback below
-             raise Exception("Gemini parsing failed")
+        status, result_json = upstream.post_json("gemini", _gemini_url(), _emergency_payload(city, country), timeout=10)
+        return _parse_emergency(status, result_json)
+    except Exception as e:
+        return dict(DEFAULT_EMERGENCY_INFO)
 
+@timed("advisory.get_emergency_info")
+async def aget_emergency_info(city: str, country: str) -> dict:
+    """Async get_emergency_info."""
+    local = _local_emergency_info(city, country)
+    if local:
+        return local
+
+    try:
+        status, result_json = await upstream.apost_json("gemini", _gemini_url(), _emergency_payload(city, country), timeout=10)
+        return _parse_emergency(status, result_json)
     except Exception as e:
-        # Fallback to International Default
-        return {
-            "ambulance": "112", 
-            "police": "112", 
-            "general": "112", 
-            "notes": "Could not fetch local numbers. Dial 112 for international emergency."
-        }
+        return dict(DEFAULT_EMERGENCY_INFO)
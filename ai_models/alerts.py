@@ -0,0 +1,385 @@
+import bisect
+import inspect
+import json
+import math
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from ai_models import metrics, quota, store, upstream
+from ai_models.environment import aget_air_quality, aget_forecast_series
+from ai_models.metrics import timed
+
+# AQI threshold alerts.
+# Subscriptions are stored in the local store database, keyed by grid cell.
+# An evaluation cycle fetches each cell that has subscriptions once (at
+# background quota priority), then evaluates every subscription in the cell in
+# one batch. Thresholds are kept sorted per (pollutant, horizon), so the alerts
+# that fire are the slice between the previous and the current reading, found
+# by bisection. Notifications go out through pluggable sinks.
+
+POLLUTANTS = ("aqi", "PM2.5", "PM10", "NO2", "SO2", "O3", "CO")
+MAX_HORIZON_HOURS = 72       # Forecast alerts look at most this far ahead
+COOLDOWN = 3 * 3600          # Minimum seconds between notifications for one alert
+MIN_CYCLE_INTERVAL = 300     # Unforced cycles closer together than this are skipped
+FETCH_CONCURRENCY = 8        # Cells fetched at once
+MAX_SSE_STREAMS = 32         # Open event streams per process (each holds a worker thread)
+SSE_MAX_SECONDS = 600        # A stream is closed after this long; EventSource reconnects
+SSE_RETRY_MS = 5000          # Reconnect delay suggested to clients
+# Webhooks to private/loopback addresses are refused unless explicitly allowed (local testing)
+ALLOW_PRIVATE_WEBHOOKS = os.getenv("ALERT_ALLOW_PRIVATE_WEBHOOKS", "0") == "1"
+
+_lock = threading.Lock()
+_cycle_lock = threading.Lock()
+_conn = None
+_last_cycle = 0
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        import sqlite3
+        _conn = sqlite3.connect(store.STORE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id TEXT PRIMARY KEY,
+                cell TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                pollutant TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                horizon_hours INTEGER NOT NULL,
+                sink TEXT NOT NULL,
+                target TEXT,
+                created INTEGER NOT NULL,
+                last_notified INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS alerts_by_cell ON alerts (cell, pollutant, horizon_hours, threshold);
+            -- Last reading per cell and metric, so a cycle knows what was crossed since the previous one
+            CREATE TABLE IF NOT EXISTS alert_readings (
+                cell TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL,
+                ts INTEGER NOT NULL,
+                PRIMARY KEY (cell, metric)
+            );
+        """)
+        _conn.commit()
+    return _conn
+
+_COLUMNS = ("id", "cell", "lat", "lon", "pollutant", "threshold", "horizon_hours", "sink", "target", "created", "last_notified")
+
+def _metric(pollutant: str, horizon_hours: int) -> str:
+    return f"{pollutant}@{horizon_hours}h"
+
+# --- Sinks ---
+# A sink is called with (alert, event) and may be a coroutine function.
+
+SINKS = {}
+
+def register_sink(name: str, func):
+    """Adds a notification sink (e.g. an email or push sender)."""
+    SINKS[name] = func
+
+def _check_webhook_url(url: str):
+    import ipaddress
+    import socket
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("Webhook target must be an http(s) URL")
+    if ALLOW_PRIVATE_WEBHOOKS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or 443)}
+    except socket.gaierror:
+        raise ValueError("Webhook host does not resolve")
+    if not all(ipaddress.ip_address(a.split("%")[0]).is_global for a in addresses):
+        raise ValueError("Webhook target must be a public address")
+
+async def _webhook_sink(alert, event):
+    import asyncio
+    # Re-checked at send time, the host may resolve elsewhere by now
+    await asyncio.to_thread(_check_webhook_url, alert["target"])
+    status, _ = await upstream.apost_json("alert_webhook", alert["target"], event, timeout=5)
+    if status >= 400:
+        raise upstream.UpstreamError(f"alert_webhook: HTTP {status}")
+
+_sse_lock = threading.Lock()
+_sse_listeners = {}  # alert id -> [queue.Queue]
+
+def _sse_sink(alert, event):
+    with _sse_lock:
+        listeners = list(_sse_listeners.get(alert["id"], []))
+    for q in listeners:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass  # Slow client, drop rather than block the cycle
+
+def sse_streams_full() -> bool:
+    """True when MAX_SSE_STREAMS streams are already open."""
+    with _sse_lock:
+        return sum(len(listeners) for listeners in _sse_listeners.values()) >= MAX_SSE_STREAMS
+
+def sse_stream(alert_id: str, heartbeat: float = 15, max_seconds: float = SSE_MAX_SECONDS):
+    """
+    Server-sent events for one alert, until the client disconnects or max_seconds pass.
+    Only events from cycles run in this process reach it.
+    """
+    q = queue.Queue(maxsize=100)
+    with _sse_lock:
+        open_streams = sum(len(listeners) for listeners in _sse_listeners.values())
+        if open_streams >= MAX_SSE_STREAMS:
+            q = None
+        else:
+            _sse_listeners.setdefault(alert_id, []).append(q)
+    if q is None:
+        # Lost the race for the last slot since the route checked sse_streams_full()
+        yield f"retry: {SSE_RETRY_MS}\n: server busy\n\n"
+        return
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n: connected\n\n"
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = q.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: aqi-alert\ndata: {json.dumps(event)}\n\n"
+    finally:
+        with _sse_lock:
+            _sse_listeners[alert_id].remove(q)
+            if not _sse_listeners[alert_id]:
+                del _sse_listeners[alert_id]
+
+LOCAL_OUTBOX = deque(maxlen=1000)
+
+def _local_sink(alert, event):
+    """Keeps notifications in memory (development and tests)."""
+    LOCAL_OUTBOX.append(event)
+    print(f"🔔 {event['message']} [alert {alert['id']}]")
+
+register_sink("webhook", _webhook_sink)
+register_sink("sse", _sse_sink)
+register_sink("local", _local_sink)
+
+# --- Subscriptions ---
+
+def create_alert(lat, lon, threshold, pollutant: str = "aqi", horizon_hours: int = 0, sink: str = "local", target: str = None) -> dict:
+    """
+    Stores an alert for when `pollutant` at lat/lon rises to `threshold` or above.
+    With horizon_hours, fires when the AQI forecast reaches it within that many hours.
+    Raises ValueError on invalid input.
+    """
+    lat, lon, threshold, horizon = float(lat), float(lon), float(threshold), float(horizon_hours)
+    if not horizon.is_integer():
+        raise ValueError("horizon_hours must be a whole number of hours")
+    horizon_hours = int(horizon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Invalid coordinates")
+    if pollutant not in POLLUTANTS:
+        raise ValueError(f"pollutant must be one of {', '.join(POLLUTANTS)}")
+    if not math.isfinite(threshold) or threshold <= 0:
+        raise ValueError("threshold must be a positive number")
+    if not 0 <= horizon_hours <= MAX_HORIZON_HOURS:
+        raise ValueError(f"horizon_hours must be between 0 and {MAX_HORIZON_HOURS}")
+    if horizon_hours and pollutant != "aqi":
+        raise ValueError("Forecast alerts (horizon_hours) are only available for 'aqi'")
+    if sink not in SINKS:
+        raise ValueError(f"sink must be one of {', '.join(SINKS)}")
+    if sink == "webhook":
+        _check_webhook_url(target)
+
+    alert = {
+        "id": secrets.token_urlsafe(12), "cell": store.grid_cell(lat, lon), "lat": lat, "lon": lon,
+        "pollutant": pollutant, "threshold": threshold, "horizon_hours": horizon_hours,
+        "sink": sink, "target": target, "created": int(time.time()), "last_notified": None,
+    }
+    with _lock:
+        conn = _get_conn()
+        conn.execute(f"INSERT INTO alerts ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                     [alert[c] for c in _COLUMNS])
+        conn.commit()
+    return alert
+
+def get_alert(alert_id: str) -> dict:
+    with _lock:
+        row = _get_conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+def delete_alert(alert_id: str) -> bool:
+    with _lock:
+        conn = _get_conn()
+        deleted = conn.execute("DELETE FROM alerts WHERE id = ?", (alert_id,)).rowcount
+        conn.commit()
+    return bool(deleted)
+
+def _load_groups() -> dict:
+    """{cell: {metric: (sorted thresholds, alerts in the same order)}}"""
+    with _lock:
+        rows = _get_conn().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM alerts ORDER BY cell, pollutant, horizon_hours, threshold"
+        ).fetchall()
+    cells = {}
+    for row in rows:
+        alert = dict(zip(_COLUMNS, row))
+        thresholds, alerts = cells.setdefault(alert["cell"], {}).setdefault(
+            _metric(alert["pollutant"], alert["horizon_hours"]), ([], []))
+        thresholds.append(alert["threshold"])
+        alerts.append(alert)
+    return cells
+
+def _load_readings() -> dict:
+    with _lock:
+        rows = _get_conn().execute("SELECT cell, metric, value, ts FROM alert_readings").fetchall()
+    return {(cell, metric): (value, ts) for cell, metric, value, ts in rows}
+
+# --- Evaluation ---
+
+async def _fetch_cell(cell: str, wanted: set, now: float) -> dict:
+    """Current readings for the metrics subscribed in a cell: {metric: value}."""
+    import asyncio
+    lat, lon = store.cell_center(cell)
+    horizons = {int(m.split("@")[1][:-1]) for m in wanted if not m.endswith("@0h")}
+    air, series = await asyncio.gather(
+        aget_air_quality(lat, lon),
+        aget_forecast_series(lat, lon) if horizons else asyncio.sleep(0, None),
+    )
+
+    readings = {}
+    if air:
+        readings[_metric("aqi", 0)] = air.get("aqi")
+        for name, values in air.get("pollutants", {}).items():
+            readings[_metric(name, 0)] = values.get("concentration")
+    if series:
+        # Series timestamps are sorted: slice the hours from now to the horizon
+        start = bisect.bisect_right(series["ts"], now - 3600)
+        for hours in horizons:
+            end = bisect.bisect_right(series["ts"], now + hours * 3600)
+            if end > start:
+                readings[_metric("aqi", hours)] = max(series["aqi"][start:end])
+    return {m: v for m, v in readings.items() if m in wanted and isinstance(v, (int, float))}
+
+def _due(thresholds: list, alerts: list, previous: tuple, value: float, now: float) -> list:
+    """
+    The alerts a reading fires, in one bisection pass over the sorted thresholds:
+    those the value rose through since the previous reading (previous < t <= value),
+    plus alerts created since then that are already at or below the value.
+    """
+    prev_value, prev_ts = previous if previous else (None, 0)
+    hi = bisect.bisect_right(thresholds, value)
+    lo = 0 if prev_value is None else min(hi, bisect.bisect_right(thresholds, prev_value))
+    due = alerts[lo:hi] + [a for a in alerts[:lo] if a["created"] >= prev_ts]
+    return [a for a in due if not a["last_notified"] or now - a["last_notified"] >= COOLDOWN]
+
+def _event(alert: dict, value: float, now: float) -> dict:
+    label = "AQI" if alert["pollutant"] == "aqi" else alert["pollutant"]
+    if alert["horizon_hours"]:
+        message = f"{label} is forecast to reach {value:g} in the next {alert['horizon_hours']} hours (your threshold: {alert['threshold']:g})."
+    else:
+        message = f"{label} at your location is {value:g}, at or above your threshold of {alert['threshold']:g}."
+    return {
+        "alert_id": alert["id"], "lat": alert["lat"], "lon": alert["lon"], "pollutant": alert["pollutant"],
+        "threshold": alert["threshold"], "horizon_hours": alert["horizon_hours"], "value": value,
+        "observed_at": int(now), "message": message,
+    }
+
+async def _notify(alert: dict, event: dict) -> bool:
+    try:
+        result = SINKS[alert["sink"]](alert, event)
+        if inspect.isawaitable(result):
+            await result
+        metrics.inc("breatheai_alert_notifications_total", {"sink": alert["sink"], "result": "sent"})
+        return True
+    except Exception as e:
+        print(f"Alert Sink Error ({alert['sink']}): {e}")
+        metrics.inc("breatheai_alert_notifications_total", {"sink": alert["sink"], "result": "failed"})
+        return False
+
+async def _aevaluate(now: float) -> dict:
+    import asyncio
+    groups = _load_groups()
+    previous = _load_readings()
+    summary = {"cells": len(groups), "subscriptions": sum(len(a) for g in groups.values() for _, a in g.values()),
+               "cells_fetched": 0, "cells_failed": 0, "notified": 0, "failed_notifications": 0}
+    metrics.set_gauge("breatheai_alert_subscriptions", summary["subscriptions"])
+    if not groups:
+        return summary
+
+    limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def run_cell(cell, cell_groups):
+        async with limit:
+            try:
+                readings = await _fetch_cell(cell, set(cell_groups), now)
+            except Exception as e:
+                print(f"Alert Fetch Error ({cell}): {e}")
+                readings = {}
+        if not readings:
+            summary["cells_failed"] += 1
+            return [], []
+        summary["cells_fetched"] += 1
+        fired = []
+        for metric, value in readings.items():
+            thresholds, alerts = cell_groups[metric]
+            fired += [(a, value) for a in _due(thresholds, alerts, previous.get((cell, metric)), value, now)]
+        return fired, [(cell, metric, value, int(now)) for metric, value in readings.items()]
+
+    try:
+        with quota.priority(quota.BACKGROUND):
+            results = await asyncio.gather(*(run_cell(cell, g) for cell, g in groups.items()))
+            fired = [f for cell_fired, _ in results for f in cell_fired]
+            sent = await asyncio.gather(*(_notify(alert, _event(alert, value, now)) for alert, value in fired))
+    finally:
+        await upstream.aclose()
+
+    notified = [alert["id"] for (alert, _), ok in zip(fired, sent) if ok]
+    summary["notified"] = len(notified)
+    summary["failed_notifications"] = len(sent) - len(notified)
+    with _lock:
+        conn = _get_conn()
+        conn.executemany("INSERT OR REPLACE INTO alert_readings VALUES (?, ?, ?, ?)", [r for _, rows in results for r in rows])
+        conn.executemany("UPDATE alerts SET last_notified = ? WHERE id = ?", [(int(now), i) for i in notified])
+        conn.commit()
+    return summary
+
+@timed("alerts.evaluate")
+def evaluate(force: bool = False) -> dict:
+    """
+    Runs one evaluation cycle over all subscriptions and returns a summary.
+    Skipped if another cycle is running, or (unless forced) one ran in the last MIN_CYCLE_INTERVAL.
+    """
+    import asyncio
+    global _last_cycle
+    if not _cycle_lock.acquire(blocking=False):
+        return {"skipped": "A cycle is already running"}
+    try:
+        now = time.time()
+        if not force and now - _last_cycle < MIN_CYCLE_INTERVAL:
+            return {"skipped": f"Last cycle ran {int(now - _last_cycle)}s ago"}
+        _last_cycle = now
+        start = time.perf_counter()
+        summary = asyncio.run(_aevaluate(now))
+        summary["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return summary
+    finally:
+        _cycle_lock.release()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Evaluate AQI alert subscriptions.")
+    parser.add_argument("--every", type=float, help="Keep running, one cycle every N seconds")
+    args = parser.parse_args()
+    while True:
+        print(json.dumps(evaluate(force=True)))
+        if not args.every:
+            break
+        time.sleep(args.every)
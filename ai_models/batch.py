@@ -0,0 +1,177 @@
+import threading
+import time
+
+from ai_models import quota, store, upstream
+from ai_models.environment import aget_weather, aget_air_quality, aget_forecast_series, aget_aqi_history
+from ai_models.metrics import timed, record_cache
+from ai_models.upstream import UpstreamError
+
+# Batch environment lookups.
+# Points are deduplicated to grid cells (~11 km, see store.py) and each cell
+# is fetched once, at its centre, for just the sections the caller asked for.
+# All (cell, section) fetches run concurrently under one shared deadline.
+# Whatever isn't back by then is reported as an error on the affected points
+# rather than failing the whole batch.
+# Fetches run at background quota priority, so a large batch only spends
+# quota above the reserved headroom and can't starve dashboard requests.
+
+SECTIONS = ("weather", "aqi", "forecast", "history")
+MAX_POINTS = 100
+DEFAULT_DEADLINE = 8.0   # Seconds for the whole batch
+MAX_DEADLINE = 20.0
+FETCH_CONCURRENCY = 16   # (cell, section) fetches in flight at once
+CELL_CACHE_DURATION = 600  # Weather/AQI per cell; forecast and history have their own caches
+MAX_CACHED = 5000
+
+_cache_lock = threading.Lock()
+_CELL_CACHE = {}  # (cell, section) -> (timestamp, data)
+
+async def _weather(lat, lon):
+    return await aget_weather(lat, lon)
+
+async def _aqi(lat, lon):
+    data = await aget_air_quality(lat, lon)
+    if not data:
+        raise UpstreamError("Air quality unavailable")
+    return data
+
+async def _forecast(lat, lon):
+    series = await aget_forecast_series(lat, lon)
+    if not series:
+        raise UpstreamError("Forecast unavailable")
+    return series["daily"][:5]
+
+async def _history(lat, lon):
+    return await aget_aqi_history(lat, lon)
+
+FETCHERS = {"weather": _weather, "aqi": _aqi, "forecast": _forecast, "history": _history}
+CACHED_SECTIONS = {"weather", "aqi"}
+
+def _cached(cell: str, section: str):
+    with _cache_lock:
+        cached = _CELL_CACHE.get((cell, section))
+    hit = cached is not None and time.time() - cached[0] < CELL_CACHE_DURATION
+    record_cache("batch", hit)
+    return cached[1] if hit else None
+
+def _save(cell: str, section: str, data):
+    now = time.time()
+    with _cache_lock:
+        if len(_CELL_CACHE) >= MAX_CACHED:
+            for key in [k for k, (ts, _) in _CELL_CACHE.items() if now - ts >= CELL_CACHE_DURATION]:
+                del _CELL_CACHE[key]
+            if len(_CELL_CACHE) >= MAX_CACHED:
+                _CELL_CACHE.clear()
+        _CELL_CACHE[(cell, section)] = (now, data)
+
+def parse_batch_request(body: dict) -> tuple:
+    """
+    Validates a batch request body: {"points": [{"lat", "lon"} or [lat, lon], ...],
+    "sections": [...], "deadline": seconds}. Returns (points, sections, deadline).
+    Raises ValueError.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get("points"), list) or not body["points"]:
+        raise ValueError("points must be a non-empty list")
+    if len(body["points"]) > MAX_POINTS:
+        raise ValueError(f"At most {MAX_POINTS} points per batch")
+
+    points = []
+    for point in body["points"]:
+        try:
+            lat, lon = (point["lat"], point["lon"]) if isinstance(point, dict) else point
+            lat, lon = float(lat), float(lon)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each point must be {\"lat\": ..., \"lon\": ...} or [lat, lon]")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Invalid coordinates: {lat}, {lon}")
+        points.append((lat, lon))
+
+    sections = body.get("sections") or list(SECTIONS)
+    if not isinstance(sections, list) or any(s not in SECTIONS for s in sections):
+        raise ValueError(f"sections must be a list drawn from {', '.join(SECTIONS)}")
+
+    try:
+        deadline = float(body.get("deadline", DEFAULT_DEADLINE))
+    except (TypeError, ValueError):
+        raise ValueError("deadline must be a number of seconds")
+    deadline = min(max(deadline, 0.1), MAX_DEADLINE)
+    return points, [s for s in SECTIONS if s in sections], deadline
+
+@timed("batch.get_environment")
+async def aget_batch_environment(points: list, sections: list = SECTIONS, deadline: float = DEFAULT_DEADLINE) -> dict:
+    """
+    Environment sections for many (lat, lon) points.
+    Each point gets a status: 'ok', 'partial' (some sections missing, see its
+    'errors') or 'error' (no section available).
+    """
+    import asyncio
+    start = time.perf_counter()
+    cells = {store.grid_cell(lat, lon) for lat, lon in points}
+    limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch(cell, section):
+        async with limit:
+            return await FETCHERS[section](*store.cell_center(cell))
+
+    results = {}  # (cell, section) -> data
+    tasks = {}
+    # Tasks copy the context when created, so they inherit the priority
+    with quota.priority(quota.BACKGROUND):
+        for cell in cells:
+            for section in sections:
+                data = _cached(cell, section) if section in CACHED_SECTIONS else None
+                if data is not None:
+                    results[(cell, section)] = data
+                else:
+                    tasks[(cell, section)] = asyncio.create_task(fetch(cell, section))
+
+    errors = {}   # (cell, section) -> message
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for key, task in tasks.items():
+            if task in pending:
+                errors[key] = "Deadline exceeded"
+            elif task.exception() is not None:
+                errors[key] = str(task.exception()) or type(task.exception()).__name__
+            else:
+                results[key] = task.result()
+                if key[1] in CACHED_SECTIONS:
+                    _save(*key, results[key])
+
+    response_points = []
+    for lat, lon in points:
+        cell = store.grid_cell(lat, lon)
+        point = {"lat": lat, "lon": lon, "cell": cell}
+        point_errors = {}
+        for section in sections:
+            if (cell, section) in results:
+                point[section] = results[(cell, section)]
+            else:
+                point_errors[section] = errors[(cell, section)]
+        if point_errors:
+            point["errors"] = point_errors
+        point["status"] = "ok" if not point_errors else "error" if len(point_errors) == len(sections) else "partial"
+        response_points.append(point)
+
+    return {
+        "points": response_points,
+        "sections": list(sections),
+        "cells": len(cells),
+        "fetched": len(tasks),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+def get_batch_environment(points: list, sections: list = SECTIONS, deadline: float = DEFAULT_DEADLINE) -> dict:
+    """Sync entry point (Flask): runs the batch on a private event loop."""
+    import asyncio
+
+    async def run():
+        try:
+            return await aget_batch_environment(points, sections, deadline)
+        finally:
+            await upstream.aclose()
+
+    return asyncio.run(run())
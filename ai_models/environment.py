@@ -1,13 +1,28 @@
 import os
-import requests
 import math
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+import time
+from collections import OrderedDict
+from ai_models import profiler, store, upstream
+from ai_models.forecast import build_forecast_series
+from ai_models.metrics import timed, record_cache
+from ai_models.upstream import UpstreamError
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 AQI_API_KEY = os.getenv("AQI_API_KEY")
 
+# Upstream hosts (overridable so benchmarks can point at a local stand-in server)
+OWM_BASE_URL = os.getenv("OWM_BASE_URL", "https://api.openweathermap.org")
+WAQI_BASE_URL = os.getenv("WAQI_BASE_URL", "https://api.waqi.info")
+HISTORY_LAG = 2 * 3600  # Seconds of recent history not yet published upstream
+HISTORY_MERGE_GAP = 6 * 3600  # Gaps closer together than this are fetched in one call
+MAX_HISTORY_CALLS = 4   # Backfill calls per request; further gaps are filled on later requests
+FORECAST_CACHE_DURATION = 600  # 10 minutes, same as the API response cache
+MAX_FORECASTS = 2000    # Cached forecast series (LRU, one per grid cell)
+
+_forecast_lock = threading.Lock()
+_FORECAST_CACHE = OrderedDict()  # cell -> {'series', 'timestamp'}, least recently used first
+
 def calculate_aqi(pm25: float) -> int:
     """
     Calculates AQI based on PM2.5 concentration using US EPA standards.
@@ -50,218 +65,375 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
-def get_waqi_data(lat: float, lon: float) -> dict:
-    """Fetches AQI data from WAQI API with 25km distance check."""
-    try:
-        url = f"https://api.waqi.info/feed/geo:{lat};{lon}/?token={AQI_API_KEY}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+# --- Upstream URLs and response parsing ---
+# Shared by the sync functions and their async (a*) counterparts below.
+
+def _waqi_url(lat, lon):
+    return f"{WAQI_BASE_URL}/feed/geo:{lat};{lon}/?token={AQI_API_KEY}"
+
+def _owm_pollution_url(lat, lon):
+    return f"{OWM_BASE_URL}/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}"
+
+def _weather_url(lat, lon):
+    return f"{OWM_BASE_URL}/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
+
+def _geocode_url(city, country_code):
+    query = f"{city},{country_code}" if country_code else city
+    return f"{OWM_BASE_URL}/geo/1.0/direct?q={query}&limit=5&appid={OPENWEATHER_API_KEY}"
+
+def _forecast_url(lat, lon):
+    return f"{OWM_BASE_URL}/data/2.5/air_pollution/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}"
+
+def _history_url(lat, lon, start_ts, end_ts):
+    return f"{OWM_BASE_URL}/data/2.5/air_pollution/history?lat={lat}&lon={lon}&start={start_ts}&end={end_ts}&appid={OPENWEATHER_API_KEY}"
+
+def _parse_waqi(data: dict, lat: float, lon: float) -> dict:
+    """Returns the WAQI station data, or {} if unavailable or the station is >25km away."""
+    if data.get('status') != 'ok':
+        return {}
         
-        if data.get('status') != 'ok':
-            return {}
+    result = data.get('data', {})
+    
+    # Distance Check meant to avoid distant city data for rural areas
+    station_geo = result.get('city', {}).get('geo', [])
+    if len(station_geo) >= 2:
+        try:
+            station_lat, station_lon = float(station_geo[0]), float(station_geo[1])
+            dist = haversine_distance(float(lat), float(lon), station_lat, station_lon)
+            print(f"WAQI Station Distance: {dist:.1f} km ({result.get('city', {}).get('name')})")
             
-        result = data.get('data', {})
+            if dist > 25:
+                # print("WAQI Station too far (>25km). Fallback to OWM.")
+                return {}
+        except Exception as e:
+            pass # print(f"Distance calc error: {e}")
+
+    return result
+
+def _parse_owm_pollution(data: dict, lat: float, lon: float) -> dict:
+    if not data.get('list'):
+        return {}
         
-        # Distance Check meant to avoid distant city data for rural areas
-        station_geo = result.get('city', {}).get('geo', [])
-        if len(station_geo) >= 2:
-            try:
-                station_lat, station_lon = float(station_geo[0]), float(station_geo[1])
-                dist = haversine_distance(lat, lon, station_lat, station_lon)
-                print(f"WAQI Station Distance: {dist:.1f} km ({result.get('city', {}).get('name')})")
-                
-                if dist > 25:
-                    # print("WAQI Station too far (>25km). Fallback to OWM.")
-                    return {}
-            except Exception as e:
-                pass # print(f"Distance calc error: {e}")
-
-        return result
+    record = data['list'][0]
+    components = record.get('components', {})
+    pm25 = components.get('pm2_5', 0)
+    store.record_points(lat, lon, [(record['dt'], pm25, calculate_aqi(pm25))], observed=True)
+    
+    return {
+        "aqi": calculate_aqi(pm25),
+        "pollutants": {
+            "PM2.5": {"concentration": components.get("pm2_5", 0)},
+            "PM10": {"concentration": components.get("pm10", 0)},
+            "NO2": {"concentration": components.get("no2", 0)},
+            "SO2": {"concentration": components.get("so2", 0)},
+            "O3": {"concentration": components.get("o3", 0)},
+            "CO": {"concentration": components.get("co", 0)}
+        }
+    }
+
+def _waqi_to_aqi_data(waqi_data: dict) -> dict:
+    iaqi = waqi_data.get('iaqi', {})
+    return {
+        "aqi": waqi_data.get('aqi', 0),
+        "pollutants": {
+            "PM2.5": {"concentration": iaqi.get("pm25", {}).get("v", 0)},
+            "PM10": {"concentration": iaqi.get("pm10", {}).get("v", 0)},
+            "NO2": {"concentration": iaqi.get("no2", {}).get("v", 0)},
+            "SO2": {"concentration": iaqi.get("so2", {}).get("v", 0)},
+            "O3": {"concentration": iaqi.get("o3", {}).get("v", 0)},
+            "CO": {"concentration": iaqi.get("co", {}).get("v", 0)}
+        }
+    }
+
+def _build_environment(lat, lon, weather_data: dict, waqi_data: dict, aqi_data: dict, override_city: str = None) -> dict:
+    # Default if both fail
+    if not aqi_data:
+        aqi_data = {
+            "aqi": 0,
+            "pollutants": {k: {"concentration": 0} for k in ["PM2.5", "PM10", "NO2", "SO2", "O3", "CO"]}
+        }
+
+    # Determine City Name
+    # Priority: Override > OWM (Weather Name) > WAQI (Station Name)
+    city_name = override_city
+    if not city_name:
+         city_name = weather_data.get("name", waqi_data.get('city', {}).get('name'))
+
+    return {
+        "temperature": weather_data.get("main", {}).get("temp"),
+        "humidity": weather_data.get("main", {}).get("humidity"),
+        "description": weather_data.get("weather", [{}])[0].get("description"),
+        "icon": weather_data.get("weather", [{}])[0].get("icon"),
+        "city": city_name, 
+        "country": weather_data.get("sys", {}).get("country"),
+        "aqi": aqi_data['aqi'],
+        "pollutants": aqi_data['pollutants'],
+        "lat": lat,
+        "lon": lon
+    }
+
+def _parse_weather(weather_data: dict) -> dict:
+    return {
+        "temperature": weather_data.get("main", {}).get("temp"),
+        "humidity": weather_data.get("main", {}).get("humidity"),
+        "description": weather_data.get("weather", [{}])[0].get("description"),
+        "icon": weather_data.get("weather", [{}])[0].get("icon"),
+        "city": weather_data.get("name"),
+        "country": weather_data.get("sys", {}).get("country"),
+    }
+
+def _station_air_quality(waqi_data: dict) -> dict:
+    aqi_data = _waqi_to_aqi_data(waqi_data)
+    aqi_data["station"] = waqi_data.get('city', {}).get('name')
+    return aqi_data
+
+def _parse_coordinates(data: list) -> list:
+    if not data:
+        return []
+
+    return [
+        {
+            "lat": loc["lat"],
+            "lon": loc["lon"],
+            "name": loc["name"],
+            "country": loc["country"],
+            "state": loc.get("state", "")
+        }
+        for loc in data
+    ]
+
+def _parse_aqi_points(data: dict) -> list:
+    points = []
+    for item in data.get('list', []):
+        pm25 = item['components']['pm2_5']
+        points.append((item['dt'], pm25, calculate_aqi(pm25)))
+    return points
+
+def _cached_forecast(cell: str):
+    with _forecast_lock:
+        cached = _FORECAST_CACHE.get(cell)
+        if cached and time.time() - cached['timestamp'] >= FORECAST_CACHE_DURATION:
+            del _FORECAST_CACHE[cell]
+            cached = None
+        elif cached:
+            _FORECAST_CACHE.move_to_end(cell)
+    record_cache("forecast", cached is not None)
+    return cached['series'] if cached else None
+
+def _store_forecast(lat, lon, cell: str, data: dict) -> dict:
+    with profiler.span(profiler.AQI):
+        points = _parse_aqi_points(data)
+    store.record_points(lat, lon, points, observed=False)
+    with profiler.span(profiler.AQI):
+        series = build_forecast_series(points)
+    with _forecast_lock:
+        _FORECAST_CACHE[cell] = {'series': series, 'timestamp': time.time()}
+        _FORECAST_CACHE.move_to_end(cell)
+        while len(_FORECAST_CACHE) > MAX_FORECASTS:
+            _FORECAST_CACHE.popitem(last=False)
+    return series
+
+def _history_window():
+    """(start_ts, end_ts) of the 7-day history window."""
+    from datetime import datetime, timedelta
+
+    end_ts = int(datetime.now().timestamp())
+    start_ts = int((datetime.now() - timedelta(days=7)).timestamp())
+    return start_ts, end_ts
+
+def _history_gaps(lat, lon, start_ts, end_ts) -> list:
+    """Ranges to backfill: missing hours, with nearby gaps merged into one call."""
+    # OWM publishes history with a short delay, so don't chase the latest hours
+    gaps = store.missing_ranges(lat, lon, start_ts, end_ts - HISTORY_LAG)
+    record_cache("history", not gaps)
+    merged = []
+    for gap_start, gap_end in gaps:
+        if merged and gap_start - merged[-1][1] <= HISTORY_MERGE_GAP:
+            merged[-1] = (merged[-1][0], gap_end)
+        else:
+            merged.append((gap_start, gap_end))
+    # Newest first: the recent days are the ones most likely to be looked at
+    return merged[::-1][:MAX_HISTORY_CALLS]
+
+def _store_history(lat, lon, gap: tuple, data: dict):
+    with profiler.span(profiler.AQI):
+        points = _parse_aqi_points(data)
+    store.record_points(lat, lon, points, observed=True)
+    # Hours OWM has no data for would otherwise be asked for again on every request
+    store.record_empty(lat, lon, *gap, points)
+
+# --- Sync API ---
+
+@timed("environment.get_waqi_data")
+def get_waqi_data(lat: float, lon: float) -> dict:
+    """Fetches AQI data from WAQI API with 25km distance check."""
+    try:
+        return _parse_waqi(upstream.get_json("waqi", _waqi_url(lat, lon)), lat, lon)
     except Exception as e:
         print(f"WAQI API Error: {e}")
         return {}
 
+@timed("environment.get_owm_pollution")
 def get_owm_pollution(lat: float, lon: float) -> dict:
     """Fetches pollution data from OpenWeatherMap as fallback."""
     try:
-        url = f"http://api.openweathermap.org/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        if not data.get('list'):
-            return {}
-            
-        record = data['list'][0]
-        components = record.get('components', {})
-        pm25 = components.get('pm2_5', 0)
-        
-        return {
-            "aqi": calculate_aqi(pm25),
-            "pollutants": {
-                "PM2.5": {"concentration": components.get("pm2_5", 0)},
-                "PM10": {"concentration": components.get("pm10", 0)},
-                "NO2": {"concentration": components.get("no2", 0)},
-                "SO2": {"concentration": components.get("so2", 0)},
-                "O3": {"concentration": components.get("o3", 0)},
-                "CO": {"concentration": components.get("co", 0)}
-            }
-        }
+        return _parse_owm_pollution(upstream.get_json("owm_pollution", _owm_pollution_url(lat, lon)), lat, lon)
     except Exception as e:
         print(f"OWM Pollution Error: {e}")
         return {}
 
-
+@timed("environment.get_environment_data")
 def get_environment_data(lat: float, lon: float, override_city: str = None) -> dict:
     """Fetches weather and air quality data."""
     try:
         # 1. Weather Data (OpenWeatherMap)
-        weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-        weather_res = requests.get(weather_url, timeout=5)
-        weather_res.raise_for_status()
-        weather_data = weather_res.json()
+        weather_data = upstream.get_json("owm_weather", _weather_url(lat, lon))
         
-        # 2. AQI Data (Try WAQI first, then OWM)
-        aqi_data = {}
+        # 2. AQI Data (Try WAQI first, then OWM if WAQI is unavailable or too far)
         waqi_data = get_waqi_data(lat, lon)
-        
-        if waqi_data:
-            # Process WAQI Data
-            iaqi = waqi_data.get('iaqi', {})
-            aqi_data = {
-                "aqi": waqi_data.get('aqi', 0),
-                "pollutants": {
-                    "PM2.5": {"concentration": iaqi.get("pm25", {}).get("v", 0)},
-                    "PM10": {"concentration": iaqi.get("pm10", {}).get("v", 0)},
-                    "NO2": {"concentration": iaqi.get("no2", {}).get("v", 0)},
-                    "SO2": {"concentration": iaqi.get("so2", {}).get("v", 0)},
-                    "O3": {"concentration": iaqi.get("o3", {}).get("v", 0)},
-                    "CO": {"concentration": iaqi.get("co", {}).get("v", 0)}
-                }
-            }
-        else:
-            # Fallback to OWM (OpenWeatherMap) if WAQI is unavailable or too far
-            # print("WAQI failed, falling back to OWM...")
-            aqi_data = get_owm_pollution(lat, lon)
-
-        # Default if both fail
-        if not aqi_data:
-            aqi_data = {
-                "aqi": 0,
-                "pollutants": {k: {"concentration": 0} for k in ["PM2.5", "PM10", "NO2", "SO2", "O3", "CO"]}
-            }
-
-        # Determine City Name
-        # Priority: Override > OWM (Weather Name) > WAQI (Station Name)
-        city_name = override_city
-        if not city_name:
-             city_name = weather_data.get("name", waqi_data.get('city', {}).get('name'))
-
-        return {
-            "temperature": weather_data.get("main", {}).get("temp"),
-            "humidity": weather_data.get("main", {}).get("humidity"),
-            "description": weather_data.get("weather", [{}])[0].get("description"),
-            "icon": weather_data.get("weather", [{}])[0].get("icon"),
-            "city": city_name, 
-            "country": weather_data.get("sys", {}).get("country"),
-            "aqi": aqi_data['aqi'],
-            "pollutants": aqi_data['pollutants'],
-            "lat": lat,
-            "lon": lon
-        }
-    except requests.RequestException as e:
+        aqi_data = _waqi_to_aqi_data(waqi_data) if waqi_data else get_owm_pollution(lat, lon)
+
+        return _build_environment(lat, lon, weather_data, waqi_data, aqi_data, override_city)
+    except UpstreamError as e:
         raise Exception(f"API Request Error: {str(e)}")
 
+@timed("environment.get_weather")
+def get_weather(lat: float, lon: float) -> dict:
+    """Weather only (temperature, humidity, conditions, place name). Raises UpstreamError."""
+    return _parse_weather(upstream.get_json("owm_weather", _weather_url(lat, lon)))
+
+@timed("environment.get_air_quality")
+def get_air_quality(lat: float, lon: float) -> dict:
+    """
+    Air quality only ({aqi, pollutants}, plus the station name for WAQI readings),
+    WAQI first then OWM. Returns {} if both fail.
+    """
+    waqi_data = get_waqi_data(lat, lon)
+    return _station_air_quality(waqi_data) if waqi_data else get_owm_pollution(lat, lon)
+
+@timed("environment.get_coordinates")
 def get_coordinates(city: str, country_code: str = None) -> list:
     """Fetches coordinates for a city."""
     try:
-        query = f"{city},{country_code}" if country_code else city
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={query}&limit=5&appid={OPENWEATHER_API_KEY}"
-        
-        response = requests.get(geo_url, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        if not data:
-            return []
-
-        return [
-            {
-                "lat": loc["lat"],
-                "lon": loc["lon"],
-                "name": loc["name"],
-                "country": loc["country"],
-                "state": loc.get("state", "")
-            }
-            for loc in data
-        ]
-    except requests.RequestException:
+        return _parse_coordinates(upstream.get_json("owm_geocode", _geocode_url(city, country_code)))
+    except UpstreamError:
         return []
 
-
+@timed("environment.get_forecast_series")
+def get_forecast_series(lat: float, lon: float) -> dict:
+    """
+    Fetches the hourly AQI forecast (~4 days) and builds the series with rollups.
+    Series are cached per grid cell so the dashboard and commute planner share one fetch.
+    """
+    cell = store.grid_cell(lat, lon)
+    series = _cached_forecast(cell)
+    if series is not None:
+        return series
+    try:
+        return _store_forecast(lat, lon, cell, upstream.get_json("owm_forecast", _forecast_url(lat, lon)))
+    except UpstreamError:
+        return {}
 
 def get_aqi_forecast(lat: float, lon: float) -> list:
-    """Fetches 5-day AQI forecast."""
-    try:
-        url = f"http://api.openweathermap.org/data/2.5/air_pollution/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        daily_forecast = {}
-        from datetime import datetime
-        
-        for item in data.get('list', []):
-            dt = datetime.fromtimestamp(item['dt'])
-            date_str = dt.strftime('%Y-%m-%d')
-            day_name = dt.strftime('%a')
-            
-            pm25 = item['components']['pm2_5']
-            aqi_val = calculate_aqi(pm25)
-            
-            if date_str not in daily_forecast:
-                daily_forecast[date_str] = {"day": day_name, "max_aqi": aqi_val, "date": date_str}
-            else:
-                daily_forecast[date_str]["max_aqi"] = max(daily_forecast[date_str]["max_aqi"], aqi_val)
-        
-        return list(daily_forecast.values())[:5]
-    except requests.RequestException:
-        return []
+    """Returns the 5-day AQI forecast as daily max/mean/min rows."""
+    series = get_forecast_series(lat, lon)
+    return series["daily"][:5] if series else []
 
+@timed("environment.get_aqi_history")
 def get_aqi_history(lat: float, lon: float) -> list:
-    """Fetches 7-day AQI history."""
+    """
+    Returns 7-day AQI history (daily max/mean/min).
+    Served from the local time-series store; only hours missing from the
+    store are backfilled from the OWM history API.
+    """
+    start_ts, end_ts = _history_window()
+    for gap in _history_gaps(lat, lon, start_ts, end_ts):
+        try:
+            _store_history(lat, lon, gap, upstream.get_json("owm_history", _history_url(lat, lon, *gap)))
+        except UpstreamError as e:
+            print(f"OWM History Error: {e}")
+
+    return store.query_series(lat, lon, start_ts, end_ts, resolution="daily")
+
+# --- Async API (used by the ASGI server, see backend/asgi.py) ---
+
+@timed("environment.get_waqi_data")
+async def aget_waqi_data(lat: float, lon: float) -> dict:
+    """Async get_waqi_data."""
     try:
-        from datetime import datetime, timedelta
-        
-        end_dt = datetime.now()
-        start_dt = end_dt - timedelta(days=7)
-        
-        start_ts = int(start_dt.timestamp())
-        end_ts = int(end_dt.timestamp())
-        
-        url = f"http://api.openweathermap.org/data/2.5/air_pollution/history?lat={lat}&lon={lon}&start={start_ts}&end={end_ts}&appid={OPENWEATHER_API_KEY}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        daily_history = {}
-        
-        for item in data.get('list', []):
-            dt = datetime.fromtimestamp(item['dt'])
-            date_str = dt.strftime('%Y-%m-%d')
-            day_name = dt.strftime('%a')
-            
-            pm25 = item['components']['pm2_5']
-            aqi_val = calculate_aqi(pm25)
-            
-            if date_str not in daily_history:
-                daily_history[date_str] = {"day": day_name, "max_aqi": aqi_val, "date": date_str}
-            else:
-                daily_history[date_str]["max_aqi"] = max(daily_history[date_str]["max_aqi"], aqi_val)
-        
-        sorted_history = sorted(daily_history.values(), key=lambda x: x['date'])
-        return sorted_history
-        
-    except requests.RequestException:
+        return _parse_waqi(await upstream.aget_json("waqi", _waqi_url(lat, lon)), lat, lon)
+    except Exception as e:
+        print(f"WAQI API Error: {e}")
+        return {}
+
+@timed("environment.get_owm_pollution")
+async def aget_owm_pollution(lat: float, lon: float) -> dict:
+    """Async get_owm_pollution."""
+    try:
+        return _parse_owm_pollution(await upstream.aget_json("owm_pollution", _owm_pollution_url(lat, lon)), lat, lon)
+    except Exception as e:
+        print(f"OWM Pollution Error: {e}")
+        return {}
+
+@timed("environment.get_environment_data")
+async def aget_environment_data(lat: float, lon: float, override_city: str = None) -> dict:
+    """Async get_environment_data. Weather and WAQI are fetched concurrently."""
+    import asyncio
+    try:
+        weather_data, waqi_data = await asyncio.gather(
+            upstream.aget_json("owm_weather", _weather_url(lat, lon)),
+            aget_waqi_data(lat, lon),
+        )
+        aqi_data = _waqi_to_aqi_data(waqi_data) if waqi_data else await aget_owm_pollution(lat, lon)
+        return _build_environment(lat, lon, weather_data, waqi_data, aqi_data, override_city)
+    except UpstreamError as e:
+        raise Exception(f"API Request Error: {str(e)}")
+
+@timed("environment.get_weather")
+async def aget_weather(lat: float, lon: float) -> dict:
+    """Async get_weather."""
+    return _parse_weather(await upstream.aget_json("owm_weather", _weather_url(lat, lon)))
+
+@timed("environment.get_air_quality")
+async def aget_air_quality(lat: float, lon: float) -> dict:
+    """Async get_air_quality."""
+    waqi_data = await aget_waqi_data(lat, lon)
+    return _station_air_quality(waqi_data) if waqi_data else await aget_owm_pollution(lat, lon)
+
+@timed("environment.get_coordinates")
+async def aget_coordinates(city: str, country_code: str = None) -> list:
+    """Async get_coordinates."""
+    try:
+        return _parse_coordinates(await upstream.aget_json("owm_geocode", _geocode_url(city, country_code)))
+    except UpstreamError:
         return []
+
+@timed("environment.get_forecast_series")
+async def aget_forecast_series(lat: float, lon: float) -> dict:
+    """Async get_forecast_series."""
+    cell = store.grid_cell(lat, lon)
+    series = _cached_forecast(cell)
+    if series is not None:
+        return series
+    try:
+        return _store_forecast(lat, lon, cell, await upstream.aget_json("owm_forecast", _forecast_url(lat, lon)))
+    except UpstreamError:
+        return {}
+
+@timed("environment.get_aqi_history")
+async def aget_aqi_history(lat: float, lon: float) -> list:
+    """Async get_aqi_history."""
+    import asyncio
+    start_ts, end_ts = _history_window()
+    gaps = _history_gaps(lat, lon, start_ts, end_ts)
+    results = await asyncio.gather(*(upstream.aget_json("owm_history", _history_url(lat, lon, *gap)) for gap in gaps),
+                                   return_exceptions=True)
+    for gap, data in zip(gaps, results):
+        if isinstance(data, UpstreamError):
+            print(f"OWM History Error: {data}")
+        elif isinstance(data, BaseException):
+            raise data
+        else:
+            _store_history(lat, lon, gap, data)
+
+    return store.query_series(lat, lon, start_ts, end_ts, resolution="daily")
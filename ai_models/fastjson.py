@@ -0,0 +1,51 @@
+import json
+import os
+from array import array
+
+from ai_models import profiler
+
+# JSON encoding/decoding for API responses and upstream payloads.
+# Uses orjson when it is installed (several times faster than the stdlib
+# encoder on our nested environment payloads) and falls back to json.
+# Output is compact with sorted keys either way, so the same data always
+# encodes to the same bytes (response ETags are hashes of these bytes).
+# Set FAST_JSON=0 to force the stdlib (e.g. to compare in the benchmark).
+
+GZIP_MIN_BYTES = 1024  # Smaller bodies aren't worth compressing
+GZIP_LEVEL = 6
+
+try:
+    if os.getenv("FAST_JSON", "1") == "0":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+
+def _default(obj):
+    if isinstance(obj, array):
+        return obj.tolist()
+    return str(obj)
+
+def dumps(obj) -> bytes:
+    """Encodes to compact UTF-8 JSON with sorted keys."""
+    with profiler.span(profiler.SERIALIZE):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=_default, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+def loads(data):
+    """Decodes JSON from bytes or str. Raises ValueError (json.JSONDecodeError) on bad input."""
+    with profiler.span(profiler.JSON_PARSE):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+def gzip_body(body: bytes) -> bytes:
+    """Gzipped copy of a response body, or None when it is too small to bother."""
+    if len(body) < GZIP_MIN_BYTES:
+        return None
+    import gzip
+    with profiler.span(profiler.SERIALIZE):
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,115 @@
+import heapq
+from array import array
+from collections import deque
+from datetime import datetime
+
+# Hourly forecast series with precomputed rollups.
+# The hourly AQI values are kept in compact arrays and every rollup the
+# dashboard or commute planner needs is computed once, when the series is built.
+
+WINDOW_SIZES = (1, 2, 3, 4)  # Hours, for "best time to go outside" windows
+WORST_HOURS = 3
+
+def build_forecast_series(points: list) -> dict:
+    """
+    Builds a forecast series from (timestamp, pm25, aqi) points.
+    Returns arrays of timestamps/AQI plus daily, best-window and worst-hour rollups.
+    """
+    points = sorted(points)
+    ts = array('q', (p[0] for p in points))
+    aqi = array('H', (p[2] for p in points))
+
+    # Daily max/mean/min in one pass
+    daily = []
+    current = None
+    for t, value in zip(ts, aqi):
+        dt = datetime.fromtimestamp(t)
+        date_str = dt.strftime('%Y-%m-%d')
+        if current is None or current["date"] != date_str:
+            current = {"day": dt.strftime('%a'), "date": date_str, "max_aqi": value, "min_aqi": value, "_sum": 0, "_n": 0}
+            daily.append(current)
+        current["max_aqi"] = max(current["max_aqi"], value)
+        current["min_aqi"] = min(current["min_aqi"], value)
+        current["_sum"] += value
+        current["_n"] += 1
+    for day in daily:
+        day["mean_aqi"] = int(round(day.pop("_sum") / day.pop("_n")))
+
+    best_windows = {}
+    for size in WINDOW_SIZES:
+        window = _best_window(ts, aqi, size)
+        if window:
+            best_windows[size] = window
+
+    worst = heapq.nlargest(WORST_HOURS, range(len(aqi)), key=lambda i: aqi[i])
+
+    return {
+        "ts": ts,
+        "aqi": aqi,
+        "daily": daily,
+        "best_windows": best_windows,
+        "worst_hours": [{"ts": ts[i], "time": _fmt(ts[i]), "aqi": aqi[i]} for i in sorted(worst)],
+    }
+
+def _best_window(ts: array, aqi: array, size: int) -> dict:
+    """
+    Finds the size-hour window whose peak AQI is lowest.
+    Window peaks come from a monotonic deque (sliding-window max), so this is O(n).
+    """
+    if len(aqi) < size:
+        return None
+
+    best = None
+    peaks = deque()  # Indices with decreasing AQI; front is the current window max
+    running = 0
+    for i, value in enumerate(aqi):
+        while peaks and aqi[peaks[-1]] <= value:
+            peaks.pop()
+        peaks.append(i)
+        running += value
+
+        start = i - size + 1
+        if start < 0:
+            continue
+        if peaks[0] < start:
+            peaks.popleft()
+
+        peak = aqi[peaks[0]]
+        if best is None or peak < best[0]:
+            best = (peak, start, running)
+        running -= aqi[start]
+
+    peak, start, total = best
+    return {
+        "start": _fmt(ts[start]),
+        "end": _fmt(ts[start + size - 1] + 3600),
+        "start_ts": ts[start],
+        "max_aqi": peak,
+        "mean_aqi": int(round(total / size)),
+    }
+
+def _fmt(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime('%a %H:%M')
+
+def forecast_summary(series: dict, days: int = 5) -> dict:
+    """JSON-friendly view of a forecast series for the API and dashboard."""
+    if not series:
+        return {}
+    return {
+        "hourly": [{"ts": t, "aqi": a} for t, a in zip(series["ts"], series["aqi"])],
+        "daily": series["daily"][:days],
+        "best_windows": {f"{size}h": w for size, w in series["best_windows"].items()},
+        "worst_hours": series["worst_hours"],
+    }
+
+def describe_for_prompt(series: dict) -> str:
+    """Compact text version of the rollups for LLM prompts."""
+    if not series or not len(series["aqi"]):
+        return "No hourly forecast available."
+
+    lines = [f"Next {len(series['aqi'])} hours, AQI range {min(series['aqi'])}-{max(series['aqi'])}."]
+    for size, w in series["best_windows"].items():
+        lines.append(f"Best {size}h window: {w['start']}-{w['end'].split(' ')[-1]} (peak AQI {w['max_aqi']}).")
+    worst = ", ".join(f"{h['time']} (AQI {h['aqi']})" for h in series["worst_hours"])
+    lines.append(f"Worst hours: {worst}.")
+    return " ".join(lines)
@@ -1,22 +1,36 @@
-import google.generativeai as genai
 import os
 import json
 from ai_models.advisory import GEMINI_API_KEY
-
-# Configure GenAI
-genai.configure(api_key=GEMINI_API_KEY)
+from ai_models.environment import get_forecast_series
+from ai_models.forecast import describe_for_prompt
+from ai_models.metrics import timed, track_upstream
 
 # Reuse the same model version for consistency
 MODEL_NAME = "gemini-1.5-flash-latest" 
 # Or if that fails again (it worked in test), fallback to 'gemini-pro' logic handled by caller? 
 # No, we assume it works now.
 
+_configured = False
+
+def _model():
+    """
+    Returns a GenerativeModel. google.generativeai is heavy to import, so it is
+    loaded and configured on the first AI call rather than at app startup.
+    """
+    global _configured
+    import google.generativeai as genai
+    if not _configured:
+        genai.configure(api_key=GEMINI_API_KEY)
+        _configured = True
+    return genai.GenerativeModel(MODEL_NAME)
+
+@timed("gemini_tools.analyze_image_quality")
 def analyze_image_quality(image_bytes, env_context):
     """
     Analyzes an uploaded image of the sky/environment.
     """
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
+        model = _model()
         
         prompt = f"""
         You are an air quality expert. Analyze this image of the sky/street.
@@ -35,17 +49,19 @@ def analyze_image_quality(image_bytes, env_context):
         # Create image blob
         image_part = {"mime_type": "image/jpeg", "data": image_bytes}
         
-        response = model.generate_content([prompt, image_part])
+        with track_upstream("gemini"):
+            response = model.generate_content([prompt, image_part])
         return response.text
     except Exception as e:
         return f"Image analysis failed: {str(e)}"
 
+@timed("gemini_tools.chat_with_ai")
 def chat_with_ai(query, env_context):
     """
     Context-aware chat about air quality.
     """
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
+        model = _model()
         
         aqi = env_context.get('aqi')
         prompt = f"""
@@ -58,24 +74,25 @@ def chat_with_ai(query, env_context):
         Answer elegantly and concisely. If they ask about running/activity, use the AQI to decide.
         """
         
-        response = model.generate_content(prompt)
+        with track_upstream("gemini"):
+            response = model.generate_content(prompt)
         return response.text
     except Exception as e:
         return f"I couldn't process that. Error: {str(e)}"
 
+@timed("gemini_tools.get_commute_advice")
 def get_commute_advice(env_context, forecast_series=None):
     """
     Analyzes forecast to suggest commute times.
+    forecast_series is the hourly series from get_forecast_series (fetched if omitted).
     """
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        
-        # Simplify forecast data for prompt
-        forecast_str = "No hourly forecast available."
-        if forecast_series:
-            # Take next 5 steps (assuming approx 3-hour blocks usually, or just day blocks)
-            # data structure of forecast_series needs checking. Assuming list of dicts.
-            forecast_str = str(forecast_series[:5]) 
+        model = _model()
+        
+        # Use the precomputed hourly rollups (see ai_models/forecast.py)
+        if forecast_series is None and env_context.get('lat') is not None:
+            forecast_series = get_forecast_series(env_context['lat'], env_context['lon'])
+        forecast_str = describe_for_prompt(forecast_series)
             
         prompt = f"""
         Task: Analyze the commute conditions for the next 24 hours.
@@ -89,17 +106,19 @@ def get_commute_advice(env_context, forecast_series=None):
         Keep it short (2 sentences).
         """
         
-        response = model.generate_content(prompt)
+        with track_upstream("gemini"):
+            response = model.generate_content(prompt)
         return response.text
     except Exception as e:
         return "Commute advice unavailable."
 
+@timed("gemini_tools.compare_history")
 def compare_history(env_context, history_data=None):
     """
     Compares today to historical data.
     """
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
+        model = _model()
         
         history_str = str(history_data) if history_data else "No history data."
         
@@ -112,7 +131,8 @@ def compare_history(env_context, history_data=None):
         Be interesting.
         """
         
-        response = model.generate_content(prompt)
+        with track_upstream("gemini"):
+            response = model.generate_content(prompt)
         return response.text
     except Exception as e:
         return "Historical comparison unavailable."
@@ -0,0 +1,220 @@
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from ai_models import upstream
+from ai_models.environment import AQI_API_KEY, WAQI_BASE_URL
+from ai_models.metrics import timed, record_cache
+
+# AQI heatmap tiles.
+# Slippy-map PNG tiles (z/x/y, Web Mercator, the scheme Leaflet and friends use)
+# coloured by AQI interpolated between every WAQI station around the tile, by
+# inverse-distance weighting. The pixel-to-station distances are one numpy
+# haversine matrix per chunk of pixels, not a haversine_distance call per pixel.
+# Stations are fetched per region (one WAQI map/bounds call shared by all the
+# tiles in a ~75 km square) and tiles are cached per refresh period, so a map
+# overlay mostly costs cached tile fetches.
+# numpy is only imported when a tile is rendered.
+
+MIN_ZOOM = 6
+MAX_ZOOM = 14
+REGION_ZOOM = 9          # Tiles at or above this zoom share one station fetch per zoom-9 tile
+TILE_SIZE = 256
+SAMPLES = 64             # Interpolated points per tile side, upscaled to TILE_SIZE
+REFRESH_SECONDS = 900    # Tiles and station lists are rebuilt every 15 minutes
+MAX_TILES = 2000         # Cached tiles (LRU)
+
+IDW_POWER = 2
+MAX_DISTANCE_KM = 25     # Stations further than this don't count (same as the WAQI point lookup)
+FADE_START_KM = 10       # Opacity fades out between here and MAX_DISTANCE_KM from the nearest station
+OPACITY = 170            # Alpha (0-255) where coverage is full
+CHUNK_PIXELS = 512       # Pixels per distance matrix, bounding memory to CHUNK_PIXELS x stations
+
+# AQI -> colour stops, matching the dashboard (green, amber, orange, red) and extended above 200
+COLOR_STOPS = [
+    (0, (74, 222, 128)),
+    (50, (74, 222, 128)),
+    (100, (251, 191, 36)),
+    (150, (251, 146, 60)),
+    (200, (239, 68, 68)),
+    (300, (168, 85, 247)),
+    (400, (127, 29, 29)),
+]
+
+EARTH_RADIUS_KM = 6371
+
+_lock = threading.Lock()
+_TILE_CACHE = OrderedDict()  # (z, x, y, refresh bucket) -> png bytes
+_STATION_CACHE = {}          # (region, refresh bucket) -> [(lat, lon, aqi)]
+_empty_tile = None
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """(south, west, north, east) of a tile, in degrees."""
+    n = 2 ** z
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
+
+def _region(z: int, x: int, y: int) -> tuple:
+    shift = max(0, z - REGION_ZOOM)
+    return min(z, REGION_ZOOM), x >> shift, y >> shift
+
+def _padded_bounds(z: int, x: int, y: int) -> tuple:
+    """Tile bounds grown by MAX_DISTANCE_KM on every side: where stations that can colour the tile are."""
+    south, west, north, east = tile_bounds(z, x, y)
+    pad_lat = MAX_DISTANCE_KM / 111.0
+    pad_lon = MAX_DISTANCE_KM / (111.0 * max(0.1, math.cos(math.radians(max(abs(south), abs(north))))))
+    return max(-90, south - pad_lat), west - pad_lon, min(90, north + pad_lat), east + pad_lon
+
+def _stations_near(z: int, x: int, y: int, stations: list) -> list:
+    """Stations within MAX_DISTANCE_KM of the tile (the region's list also covers its other tiles)."""
+    south, west, north, east = _padded_bounds(z, x, y)
+    return [s for s in stations if south <= s[0] <= north and west <= s[1] <= east]
+
+def _bounds_url(south, west, north, east):
+    return f"{WAQI_BASE_URL}/map/bounds?latlng={south:.4f},{west:.4f},{north:.4f},{east:.4f}&token={AQI_API_KEY}"
+
+def _parse_stations(data: dict) -> list:
+    """[(lat, lon, aqi)] from a WAQI map/bounds response, skipping stations without a reading ('-')."""
+    if data.get('status') != 'ok':
+        return []
+    stations = []
+    for item in data.get('data', []):
+        try:
+            stations.append((float(item['lat']), float(item['lon']), float(item['aqi'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return stations
+
+def get_stations(region: tuple, bucket: int) -> list:
+    """Stations in a region tile plus MAX_DISTANCE_KM around it. Raises UpstreamError."""
+    key = (region, bucket)
+    with _lock:
+        stations = _STATION_CACHE.get(key)
+    record_cache("heatmap_stations", stations is not None)
+    if stations is not None:
+        return stations
+
+    stations = _parse_stations(upstream.get_json("waqi_bounds", _bounds_url(*_padded_bounds(*region))))
+
+    with _lock:
+        # Drop station lists from earlier refresh periods
+        for old in [k for k in _STATION_CACHE if k[1] != bucket]:
+            del _STATION_CACHE[old]
+        _STATION_CACHE[key] = stations
+    return stations
+
+def _encode_png(rgba) -> bytes:
+    """RGBA uint8 array (height, width, 4) -> PNG bytes (no filtering, zlib-compressed)."""
+    import zlib
+    import numpy as np
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # Leading 0 per row: filter type None
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+def _empty():
+    global _empty_tile
+    if _empty_tile is None:
+        import numpy as np
+        _empty_tile = _encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+    return _empty_tile
+
+def interpolate(lats, lons, stations):
+    """
+    Inverse-distance-weighted AQI at each (lat, lon) in the 1-D arrays, from
+    stations [(lat, lon, aqi)]. Returns (aqi, distance to nearest station in km);
+    aqi is NaN where no station is within MAX_DISTANCE_KM.
+    """
+    import numpy as np
+    station_arr = np.asarray(stations, dtype=np.float64)
+    lat2 = np.radians(station_arr[:, 0])[None, :]
+    lon2 = np.radians(station_arr[:, 1])[None, :]
+    cos_lat2 = np.cos(lat2)
+    lats, lons = np.asarray(lats), np.asarray(lons)
+    aqi = np.empty(len(lats))
+    nearest = np.empty(len(lats))
+
+    # The matrices are (pixels, stations), so go CHUNK_PIXELS pixels at a time
+    for start in range(0, len(lats), CHUNK_PIXELS):
+        chunk = slice(start, start + CHUNK_PIXELS)
+        lat1 = np.radians(lats[chunk])[:, None]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * cos_lat2 * np.sin((lon2 - np.radians(lons[chunk])[:, None]) / 2) ** 2
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+        weights = np.where(dist <= MAX_DISTANCE_KM, 1.0 / np.maximum(dist, 0.05) ** IDW_POWER, 0.0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            aqi[chunk] = np.where(total > 0, (weights @ station_arr[:, 2]) / total, np.nan)
+        nearest[chunk] = dist.min(axis=1)
+    return aqi, nearest
+
+def _colorize(aqi, nearest):
+    import numpy as np
+    levels = [s[0] for s in COLOR_STOPS]
+    rgba = np.zeros(aqi.shape + (4,), dtype=np.uint8)
+    values = np.nan_to_num(aqi, nan=0.0)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(values, levels, [s[1][channel] for s in COLOR_STOPS]).astype(np.uint8)
+    fade = np.clip((MAX_DISTANCE_KM - nearest) / (MAX_DISTANCE_KM - FADE_START_KM), 0, 1)
+    rgba[..., 3] = np.where(np.isnan(aqi), 0, OPACITY * fade).astype(np.uint8)
+    return rgba
+
+@timed("heatmap.render_tile")
+def render_tile(z: int, x: int, y: int, stations: list) -> bytes:
+    """Renders one tile from station readings."""
+    import numpy as np
+    stations = _stations_near(z, x, y, stations)
+    if not stations:
+        return _empty()
+    n = 2 ** z
+    # Sample centres: longitude is linear across the tile, latitude follows the Mercator projection
+    offsets = (np.arange(SAMPLES) + 0.5) / SAMPLES
+    lons = (x + offsets) / n * 360 - 180
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    grid_lats, grid_lons = np.meshgrid(lats, lons, indexing="ij")
+
+    aqi, nearest = interpolate(grid_lats.ravel(), grid_lons.ravel(), stations)
+    if np.isnan(aqi).all():
+        return _empty()
+    rgba = _colorize(aqi.reshape(SAMPLES, SAMPLES), nearest.reshape(SAMPLES, SAMPLES))
+    scale = TILE_SIZE // SAMPLES
+    return _encode_png(rgba.repeat(scale, axis=0).repeat(scale, axis=1))
+
+def get_tile(z: int, x: int, y: int) -> tuple:
+    """
+    PNG bytes for a heatmap tile and the seconds it stays current.
+    Raises ValueError for tiles outside the served zooms and UpstreamError
+    if the station list can't be fetched.
+    """
+    n = 2 ** z
+    if not MIN_ZOOM <= z <= MAX_ZOOM or not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Tiles are served for zoom {MIN_ZOOM}-{MAX_ZOOM}")
+
+    now = time.time()
+    bucket = int(now // REFRESH_SECONDS)
+    max_age = int((bucket + 1) * REFRESH_SECONDS - now)
+    key = (z, x, y, bucket)
+    with _lock:
+        png = _TILE_CACHE.get(key)
+        if png is not None:
+            _TILE_CACHE.move_to_end(key)
+    record_cache("heatmap_tile", png is not None)
+    if png is not None:
+        return png, max_age
+
+    png = render_tile(z, x, y, get_stations(_region(z, x, y), bucket))
+    with _lock:
+        _TILE_CACHE[key] = png
+        while len(_TILE_CACHE) > MAX_TILES:
+            _TILE_CACHE.popitem(last=False)
+    return png, max_age
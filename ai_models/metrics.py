@@ -0,0 +1,187 @@
+import inspect
+import threading
+import time
+from functools import wraps
+
+# In-process metrics in the Prometheus text format (served at /metrics).
+# Counters, gauges and histograms are plain dicts keyed by (name, labels).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name -> (type, help)
+METRICS = {
+    "breatheai_http_request_duration_seconds": ("histogram", "Latency of API routes."),
+    "breatheai_http_requests_total": ("counter", "Requests served, by route and status."),
+    "breatheai_http_requests_in_flight": ("gauge", "Requests currently being handled, by route."),
+    "breatheai_http_response_size_bytes": ("histogram", "Response payload size, by route."),
+    "breatheai_upstream_duration_seconds": ("histogram", "Latency of upstream API calls, by provider."),
+    "breatheai_upstream_errors_total": ("counter", "Failed upstream API calls, by provider."),
+    "breatheai_stage_duration_seconds": ("histogram", "Time spent in each ai_models function."),
+    "breatheai_cache_requests_total": ("counter", "Cache lookups, by cache and result (hit/miss)."),
+    "breatheai_cache_hit_ratio": ("gauge", "Cache hit ratio since start, by cache."),
+    "breatheai_quota_remaining": ("gauge", "Upstream quota tokens left, by provider and window."),
+    "breatheai_quota_requests_total": ("counter", "Quota decisions, by provider, priority and result."),
+    "breatheai_quota_wait_seconds": ("histogram", "Time upstream calls queued for quota, by provider."),
+    "breatheai_admission_rejected_total": ("counter", "Requests turned away by admission control, by route and reason."),
+    "breatheai_admission_queue_depth": ("gauge", "Requests queued for a concurrency slot, by route."),
+    "breatheai_admission_wait_seconds": ("histogram", "Time admitted requests spent queued, by route."),
+    "breatheai_alert_subscriptions": ("gauge", "AQI alert subscriptions at the last evaluation cycle."),
+    "breatheai_alert_notifications_total": ("counter", "Alert notifications, by sink and result."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}  # key -> [bucket counts..., sum, count]
+_collectors = []  # Callables that refresh gauges right before a render
+
+def _key(name, labels):
+    return (name, tuple(sorted((labels or {}).items())))
+
+def inc(name: str, labels: dict = None, value: float = 1):
+    """Increments a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name: str, value: float, labels: dict = None):
+    """Sets a gauge to an absolute value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def add_gauge(name: str, delta: float, labels: dict = None):
+    """Moves a gauge up or down."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+def observe(name: str, value: float, labels: dict = None, buckets: tuple = LATENCY_BUCKETS):
+    """Records one observation in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[1][i] += 1
+        hist[2] += value
+        hist[3] += 1
+
+def register_collector(func):
+    """Registers a function that updates gauges whenever metrics are rendered."""
+    _collectors.append(func)
+
+def record_cache(cache: str, hit: bool):
+    """Counts a cache lookup for the hit-ratio metrics."""
+    inc("breatheai_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+class timed:
+    """
+    Times a block or function into breatheai_stage_duration_seconds.
+    Usable as a decorator (@timed("environment.get_waqi_data")) or a context manager.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe("breatheai_stage_duration_seconds", time.perf_counter() - self._start, {"stage": self.stage})
+        return False
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(self.stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+class track_upstream:
+    """
+    Context manager around one upstream HTTP call.
+    Records latency, and counts an error if the block raises or `status` is set to >= 400.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.status = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = {"provider": self.provider}
+        observe("breatheai_upstream_duration_seconds", time.perf_counter() - self._start, labels)
+        if exc_type is not None or (self.status is not None and self.status >= 400):
+            inc("breatheai_upstream_errors_total", labels)
+        return False
+
+def snapshot() -> dict:
+    """Current counter values as {name: {labels: value}}, for reports and tests."""
+    result = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            result.setdefault(name, {})[labels] = value
+    return result
+
+def _fmt_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+def render() -> str:
+    """Renders all metrics in the Prometheus text exposition format."""
+    for collect in _collectors:
+        collect()
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: (v[0], list(v[1]), v[2], v[3]) for k, v in _histograms.items()}
+
+    # Derived hit ratios per cache
+    totals = {}
+    for (name, labels), value in counters.items():
+        if name == "breatheai_cache_requests_total":
+            d = dict(labels)
+            hits, total = totals.get(d["cache"], (0, 0))
+            totals[d["cache"]] = (hits + (value if d["result"] == "hit" else 0), total + value)
+    for cache, (hits, total) in totals.items():
+        gauges[_key("breatheai_cache_hit_ratio", {"cache": cache})] = hits / total if total else 0
+
+    lines = []
+    seen = set()
+    def header(name):
+        if name not in seen:
+            seen.add(name)
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        header(name)
+        for bound, n in zip(buckets, counts):
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {n}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {total}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
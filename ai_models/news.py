@@ -1,7 +1,40 @@
-import requests
-import xml.etree.ElementTree as ET
+import os
 from urllib.parse import quote
+from ai_models import upstream
+from ai_models.metrics import timed
 
+NEWS_BASE_URL = os.getenv("NEWS_BASE_URL", "https://news.google.com")
+
+def _news_url(city: str) -> str:
+    # Construct RSS URL
+    query = quote(f"{city} air pollution air quality")
+    return f"{NEWS_BASE_URL}/rss/search?q={query}&hl=en-IN&gl=IN&ceid=IN:en"
+
+def _parse_news(content: bytes, limit: int) -> list:
+    import xml.etree.ElementTree as ET
+    root = ET.fromstring(content)
+    
+    news_items = []
+    for item in root.findall('./channel/item')[:limit]:
+        title = item.find('title').text if item.find('title') is not None else "No Title"
+        link = item.find('link').text if item.find('link') is not None else "#"
+        pub_date = item.find('pubDate').text if item.find('pubDate') is not None else ""
+        source = item.find('source').text if item.find('source') is not None else "Google News"
+        
+        # Clean up title (Google News often has "Title - Source")
+        if " - " in title:
+            title = title.rsplit(" - ", 1)[0]
+            
+        news_items.append({
+            "title": title,
+            "link": link,
+            "source": source,
+            "date": pub_date
+        })
+        
+    return news_items
+
+@timed("news.get_pollution_news")
 def get_pollution_news(city: str, limit: int = 5) -> list:
     """
     Fetches latest air pollution news for a city using Google News RSS.
@@ -9,36 +42,18 @@ def get_pollution_news(city: str, limit: int = 5) -> list:
     try:
         if not city:
             return []
-            
-        # Construct RSS URL
-        query = quote(f"{city} air pollution air quality")
-        url = f"https://news.google.com/rss/search?q={query}&hl=en-IN&gl=IN&ceid=IN:en"
-        
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        root = ET.fromstring(response.content)
-        
-        news_items = []
-        for item in root.findall('./channel/item')[:limit]:
-            title = item.find('title').text if item.find('title') is not None else "No Title"
-            link = item.find('link').text if item.find('link') is not None else "#"
-            pub_date = item.find('pubDate').text if item.find('pubDate') is not None else ""
-            source = item.find('source').text if item.find('source') is not None else "Google News"
-            
-            # Clean up title (Google News often has "Title - Source")
-            if " - " in title:
-                title = title.rsplit(" - ", 1)[0]
-                
-            news_items.append({
-                "title": title,
-                "link": link,
-                "source": source,
-                "date": pub_date
-            })
-            
-        return news_items
-        
+        return _parse_news(upstream.get_content("google_news", _news_url(city)), limit)
+    except Exception as e:
+        print(f"Error fetching news: {e}")
+        return []
+
+@timed("news.get_pollution_news")
+async def aget_pollution_news(city: str, limit: int = 5) -> list:
+    """Async get_pollution_news."""
+    try:
+        if not city:
+            return []
+        return _parse_news(await upstream.aget_content("google_news", _news_url(city)), limit)
     except Exception as e:
         print(f"Error fetching news: {e}")
         return []
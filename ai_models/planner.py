@@ -1,3 +1,5 @@
+from ai_models.metrics import timed
+
 def _get_comprehensive_data(env: dict) -> dict:
     """
     Returns structured health advice based on local expert rules.
@@ -75,6 +77,7 @@ def generate_comprehensive_plan(env: dict) -> str:
 {data['evening']}
 """
 
+@timed("planner.generate_daily_plan")
 def generate_daily_plan(env: dict, ai_data: dict = None) -> dict:
     """
     Generates a personalized daily plan.
@@ -117,9 +120,11 @@ def generate_daily_plan(env: dict, ai_data: dict = None) -> dict:
         "evening_plan": evening_txt
     }
 
-def analyze_forecast(forecast_data):
+@timed("planner.analyze_forecast")
+def analyze_forecast(forecast_data, series: dict = None):
     """
     Analyzes the 5-day forecast to find the best and worst days.
+    If the hourly series is given, its precomputed windows and worst hours are included.
     """
     if not forecast_data:
         return {}
@@ -127,9 +132,15 @@ def analyze_forecast(forecast_data):
     worst_item = max(forecast_data, key=lambda x: x['max_aqi'])
     best_item = min(forecast_data, key=lambda x: x['max_aqi'])
     
-    return {
+    analysis = {
         "worst_day": f"{worst_item['day']} ({worst_item['date']})",
         "worst_aqi": worst_item['max_aqi'],
         "best_day": f"{best_item['day']} ({best_item['date']})",
         "best_aqi": best_item['max_aqi']
     }
+
+    if series:
+        analysis["best_windows"] = {f"{size}h": w for size, w in series["best_windows"].items()}
+        analysis["worst_hours"] = series["worst_hours"]
+
+    return analysis
@@ -0,0 +1,209 @@
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+# On-demand request profiling.
+# A request is profiled when it carries X-Profile-Token matching PROFILE_TOKEN,
+# or is picked at random (PROFILE_SAMPLE_RATE) on one of SAMPLED_ROUTES.
+# A sampler thread records the request thread's stack every PROFILE_INTERVAL,
+# and span() blocks in ai_models attribute time to upstream waits, JSON
+# parsing, AQI computation and serialization. Each sample is filed under the
+# span that was open when it was taken, so flamegraphs split along the same
+# lines. Profiles are written as speedscope JSON (https://www.speedscope.app)
+# or collapsed stacks (flamegraph.pl, inferno) to PROFILE_DIR, which keeps
+# only the newest PROFILE_MAX_FILES.
+# With profiling off, a span() is one ContextVar lookup.
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "breatheai-profiles"))
+MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))  # Seconds between stack samples
+DEFAULT_FORMAT = os.getenv("PROFILE_FORMAT", "speedscope")
+FORMATS = ("speedscope", "collapsed")
+MAX_CONCURRENT = 2       # Profiles running at once; further requests run unprofiled
+MAX_SAMPLES = 50000      # Per profile (~100 s at the default interval)
+
+TOKEN_HEADER = "X-Profile-Token"
+FORMAT_HEADER = "X-Profile-Format"
+
+# Routes eligible for random sampling (any route can be profiled with the token)
+SAMPLED_ROUTES = {"/api/environment/<lat>/<lon>", "/api/advisory", "/api/environment/batch"}
+
+# Span names
+UPSTREAM = "upstream"
+JSON_PARSE = "json_parse"
+AQI = "aqi"
+SERIALIZE = "serialize"
+
+ENABLED = bool(PROFILE_TOKEN) or SAMPLE_RATE > 0
+
+_current = contextvars.ContextVar("profile", default=None)
+_running_lock = threading.Lock()
+_running = 0
+_NULL_SPAN = nullcontext()
+
+class _Span:
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profile.open_spans.append(self.name)
+
+    def __exit__(self, exc_type, exc, tb):
+        profile = self.profile
+        profile.span_totals[self.name] = profile.span_totals.get(self.name, 0.0) + time.perf_counter() - self.start
+        # Concurrent (async) spans may close out of order
+        profile.open_spans.remove(self.name)
+        return False
+
+def span(name: str):
+    """Times a block into the active profile's span totals (no-op when the request isn't profiled)."""
+    profile = _current.get()
+    return _NULL_SPAN if profile is None else _Span(profile, name)
+
+class Profile:
+    """A profiled request: stack samples of one thread plus span totals."""
+
+    def __init__(self, label: str, fmt: str, requested: bool):
+        self.label = label
+        self.format = fmt
+        self.requested = requested  # Asked for with the token (vs. picked by the sample rate)
+        self.duration = None
+        self.thread_id = threading.get_ident()
+        self.open_spans = []
+        self.span_totals = {}
+        self.samples = {}  # (span, frame, frame, ...) root first -> seconds
+        self.path = None
+        self._stop = threading.Event()
+        self._token = _current.set(self)
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        last = time.perf_counter()
+        count = 0
+        while not self._stop.wait(INTERVAL) and count < MAX_SAMPLES:
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = getattr(code, "co_qualname", code.co_name)  # co_qualname is 3.11+
+                stack.append(f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            innermost = self.open_spans[-1:]  # The request thread may be changing the list
+            stack.append(f"[{innermost[0] if innermost else 'other'}]")
+            key = tuple(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0.0) + now - last
+            last = now
+            count += 1
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total time and each span's total so far (in ms)."""
+        total = self.duration if self.duration is not None else time.perf_counter() - self._start
+        timings = [("total", total)] + sorted(self.span_totals.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+    def finish(self):
+        """Stops sampling and writes the profile file. Safe to call more than once."""
+        global _running
+        if self._stop.is_set():
+            return
+        self.duration = time.perf_counter() - self._start
+        self._stop.set()
+        self._sampler.join()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            _current.set(None)  # Finished from another context (e.g. an ASGI send callback)
+        with _running_lock:
+            _running -= 1
+
+        try:
+            self.path = self._write()
+            print(f"🔬 Profiled {self.label} ({self.server_timing()}) -> {self.path}")
+        except OSError as e:
+            print(f"Profile Write Error: {e}")
+
+    def _write(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in self.label).strip("_")
+        stem = f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{self.duration * 1000:.0f}ms-{random.randrange(16 ** 4):04x}"
+        if self.format == "collapsed":
+            path = os.path.join(PROFILE_DIR, stem + ".collapsed.txt")
+            lines = [f"{';'.join(stack)} {round(seconds * 1e6)}" for stack, seconds in self.samples.items()]
+            content = "\n".join(lines) + "\n"
+        else:
+            path = os.path.join(PROFILE_DIR, stem + ".speedscope.json")
+            content = json.dumps(self._speedscope())
+        with open(path, "w") as f:
+            f.write(content)
+        _prune()
+        return path
+
+    def _speedscope(self) -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, seconds in self.samples.items():
+            ids = []
+            for name in stack:
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(seconds)
+        spans = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in sorted(self.span_totals.items()))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.label} ({spans or 'no spans'})",
+            "exporter": "breatheai",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": self.label, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            }],
+        }
+
+def _prune():
+    """Keeps the newest MAX_FILES profiles."""
+    paths = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)
+             if name.endswith((".speedscope.json", ".collapsed.txt"))]
+    if len(paths) <= MAX_FILES:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def maybe_start(label: str, token: str = None, fmt: str = None):
+    """
+    Starts profiling the current request (on this thread) if it asked for it
+    with a valid token, or was picked by the sample rate. Returns the Profile or None.
+    """
+    global _running
+    if not ENABLED:
+        return None
+    requested = bool(PROFILE_TOKEN and token) and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+    if not requested and not (label in SAMPLED_ROUTES and random.random() < SAMPLE_RATE):
+        return None
+    with _running_lock:
+        if _running >= MAX_CONCURRENT:
+            return None
+        _running += 1
+    return Profile(label, fmt if fmt in FORMATS else DEFAULT_FORMAT, requested)
@@ -0,0 +1,187 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from ai_models import metrics
+
+# Upstream quota manager.
+# Every upstream call takes a token from its provider's buckets before it goes
+# out (see upstream.py). Interactive requests (a user waiting on a page) may
+# queue briefly for a token; background and pre-warm work may only use tokens
+# above a reserved headroom, so a refresh job can never starve users. When
+# there is no headroom, low-priority work is deferred and eventually dropped.
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PREWARM = "prewarm"
+
+# Fraction of each bucket kept back for higher-priority work
+RESERVE = {INTERACTIVE: 0.0, BACKGROUND: 0.25, PREWARM: 0.5}
+
+# "limit/seconds" windows per API key, overridable with QUOTA_<NAME> (e.g. QUOTA_GEMINI="15/60,1500/86400")
+DEFAULT_QUOTAS = {
+    "owm": "60/60",                   # OpenWeatherMap free tier: 60 calls/minute (all OWM endpoints share the key)
+    "waqi": "1000/1",                 # WAQI token quota
+    "gemini": "15/60,1500/86400",     # Gemini Flash free tier: 15 requests/minute, 1500/day
+    "google_news": "60/60",           # Unofficial RSS endpoint, keep it polite
+}
+
+QUOTAS_ENABLED = os.getenv("QUOTAS_ENABLED", "1") != "0"
+MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", "2"))     # Longest an interactive call queues for a token
+MAX_DEFER = float(os.getenv("QUOTA_MAX_DEFER", "30"))  # Longest low-priority work is deferred before it's dropped
+
+class QuotaExceeded(Exception):
+    """No quota left for this call at its priority."""
+
+class TokenBucket:
+    """Refills `limit` tokens per `period` seconds. Tokens may go negative (queued reservations)."""
+
+    def __init__(self, limit: int, period: float):
+        self.capacity = float(limit)
+        self.rate = limit / period
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, level: float) -> float:
+        """Seconds until the bucket holds `level` tokens."""
+        return max(0.0, (level - self.tokens) / self.rate)
+
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+_lock = threading.Lock()
+_buckets = {}  # quota name -> [TokenBucket]
+
+def _parse_quota(spec: str) -> list:
+    buckets = []
+    for window in spec.split(","):
+        limit, period = window.strip().split("/")
+        buckets.append(TokenBucket(int(limit), float(period)))
+    return buckets
+
+def quota_name(provider: str) -> str:
+    """Maps an upstream provider label to the API key it spends ('owm_forecast' -> 'owm', 'waqi_bounds' -> 'waqi')."""
+    return provider.split("_", 1)[0] if provider.startswith(("owm_", "waqi_")) else provider
+
+def _get_buckets(name: str) -> list:
+    # Caller holds _lock
+    if name not in _buckets:
+        spec = os.getenv(f"QUOTA_{name.upper()}", DEFAULT_QUOTAS.get(name))
+        _buckets[name] = _parse_quota(spec) if spec else []
+    return _buckets[name]
+
+def current_priority() -> str:
+    return _priority.get()
+
+@contextmanager
+def priority(level: str):
+    """Runs the block's upstream calls at the given priority (follows asyncio tasks via contextvars)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def _try_acquire(provider: str, level: str) -> tuple:
+    """
+    Returns (granted, wait). If granted, the call may go out after `wait` seconds.
+    If not, headroom may return after `wait` seconds (inf: never within MAX_WAIT).
+    """
+    if not QUOTAS_ENABLED:
+        return True, 0.0
+    with _lock:
+        buckets = _get_buckets(quota_name(provider))
+        if not buckets:
+            return True, 0.0
+        now = time.monotonic()
+        for bucket in buckets:
+            bucket.refill(now)
+
+        if level == INTERACTIVE:
+            # Queue behind earlier reservations, up to MAX_WAIT
+            wait = max(bucket.wait_for(1) for bucket in buckets)
+            if wait > MAX_WAIT:
+                return False, float("inf")
+        else:
+            # Only tokens above the reserved headroom, and never a queued reservation
+            wait = max(bucket.wait_for(1 + RESERVE[level] * bucket.capacity) for bucket in buckets)
+            if wait > 0:
+                return False, wait
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return True, wait
+
+def _record(provider: str, level: str, result: str, wait: float = 0.0):
+    labels = {"provider": quota_name(provider)}
+    metrics.inc("breatheai_quota_requests_total", dict(labels, priority=level, result=result))
+    if result in ("granted", "delayed"):
+        metrics.observe("breatheai_quota_wait_seconds", wait, labels)
+
+def acquire(provider: str):
+    """Blocks until the call may go out. Raises QuotaExceeded if it has to be dropped."""
+    level = current_priority()
+    deferred = 0.0
+    while True:
+        granted, wait = _try_acquire(provider, level)
+        if granted:
+            _record(provider, level, "delayed" if wait or deferred else "granted", wait + deferred)
+            if wait:
+                time.sleep(wait)
+            return
+        if deferred + wait > MAX_DEFER:
+            _record(provider, level, "dropped")
+            raise QuotaExceeded(f"{quota_name(provider)} quota exhausted for {level} work")
+        _record(provider, level, "deferred")
+        time.sleep(wait)
+        deferred += wait
+
+async def aacquire(provider: str):
+    """Async acquire."""
+    import asyncio
+    level = current_priority()
+    deferred = 0.0
+    while True:
+        granted, wait = _try_acquire(provider, level)
+        if granted:
+            _record(provider, level, "delayed" if wait or deferred else "granted", wait + deferred)
+            if wait:
+                await asyncio.sleep(wait)
+            return
+        if deferred + wait > MAX_DEFER:
+            _record(provider, level, "dropped")
+            raise QuotaExceeded(f"{quota_name(provider)} quota exhausted for {level} work")
+        _record(provider, level, "deferred")
+        await asyncio.sleep(wait)
+        deferred += wait
+
+def headroom(provider: str) -> float:
+    """Fraction of the tightest bucket currently available (1.0 when unlimited)."""
+    if not QUOTAS_ENABLED:
+        return 1.0
+    with _lock:
+        buckets = _get_buckets(quota_name(provider))
+        if not buckets:
+            return 1.0
+        now = time.monotonic()
+        for bucket in buckets:
+            bucket.refill(now)
+        return max(0.0, min(bucket.tokens / bucket.capacity for bucket in buckets))
+
+def _export_remaining():
+    if not QUOTAS_ENABLED:
+        return
+    with _lock:
+        now = time.monotonic()
+        for name in set(DEFAULT_QUOTAS) | set(_buckets):
+            for bucket in _get_buckets(name):
+                bucket.refill(now)
+                metrics.set_gauge("breatheai_quota_remaining", max(0.0, round(bucket.tokens, 2)),
+                                  {"provider": name, "window": f"{bucket.period:g}s"})
+
+metrics.register_collector(_export_remaining)
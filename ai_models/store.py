@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Local AQI time-series store.
+# Every AQI point we fetch (live readings, forecast steps, history backfills)
+# is written here keyed by grid cell, so history can be served locally and
+# only the missing hours are requested upstream.
+# sqlite3 is imported inside the functions so app import (cold start) stays light.
+
+STORE_PATH = os.getenv("AQI_STORE_PATH", os.path.join(tempfile.gettempdir(), "breatheai_aqi.sqlite3"))
+GRID_SIZE = 0.1           # Degrees (~11 km), roughly one OWM grid square
+RETENTION_DAYS = 30       # Raw hourly points older than this are dropped
+RETENTION_INTERVAL = 3600 # Run the retention sweep at most once an hour
+EMPTY_RECHECK = 86400     # Hours upstream had no data for are asked for again after this long
+
+HOUR = 3600
+
+_lock = threading.Lock()
+_conn = None
+_last_retention = 0
+
+def grid_cell(lat: float, lon: float) -> str:
+    """Snaps a coordinate to its grid cell id, e.g. '19.1:72.9'."""
+    return f"{round(float(lat) / GRID_SIZE) * GRID_SIZE:.1f}:{round(float(lon) / GRID_SIZE) * GRID_SIZE:.1f}"
+
+def cell_center(cell: str) -> tuple:
+    """Returns the (lat, lon) centre of a grid cell id."""
+    lat, lon = cell.split(":")
+    return float(lat), float(lon)
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        import sqlite3
+        _conn = sqlite3.connect(STORE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS aqi_points (
+                cell TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                pm25 REAL NOT NULL,
+                aqi INTEGER NOT NULL,
+                observed INTEGER NOT NULL,
+                PRIMARY KEY (cell, ts)
+            )
+        """)
+        # Hours upstream was asked for and returned nothing (holes in its history)
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS empty_hours (
+                cell TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                checked INTEGER NOT NULL,
+                PRIMARY KEY (cell, ts)
+            )
+        """)
+        _conn.commit()
+    return _conn
+
+def _hour(ts: int) -> int:
+    return int(ts) - int(ts) % HOUR
+
+def record_points(lat: float, lon: float, points: list, observed: bool = True):
+    """
+    Stores (timestamp, pm25, aqi) points for the cell containing lat/lon.
+    Points are bucketed to the hour. Observations always overwrite forecasts,
+    forecasts never overwrite observations.
+    """
+    import sqlite3
+    if not points:
+        return
+    cell = grid_cell(lat, lon)
+    rows = [(cell, _hour(ts), pm25, aqi, int(observed)) for ts, pm25, aqi in points]
+    try:
+        with _lock:
+            conn = _get_conn()
+            if observed:
+                conn.executemany("INSERT OR REPLACE INTO aqi_points VALUES (?, ?, ?, ?, ?)", rows)
+            else:
+                conn.executemany("""
+                    INSERT INTO aqi_points VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (cell, ts) DO UPDATE SET pm25 = excluded.pm25, aqi = excluded.aqi
+                    WHERE aqi_points.observed = 0
+                """, rows)
+            conn.commit()
+        apply_retention()
+    except sqlite3.Error as e:
+        print(f"AQI Store Error: {e}")
+
+def record_empty(lat: float, lon: float, start_ts: int, end_ts: int, points: list):
+    """
+    Marks the hours in [start_ts, end_ts] that a backfill returned no point for,
+    so missing_ranges skips them until EMPTY_RECHECK has passed.
+    """
+    import sqlite3
+    cell = grid_cell(lat, lon)
+    got = {_hour(ts) for ts, _, _ in points}
+    now = int(time.time())
+    rows = [(cell, ts, now) for ts in range(_hour(start_ts), _hour(end_ts) + 1, HOUR) if ts not in got]
+    if not rows:
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.executemany("INSERT OR REPLACE INTO empty_hours VALUES (?, ?, ?)", rows)
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"AQI Store Error: {e}")
+
+def missing_ranges(lat: float, lon: float, start_ts: int, end_ts: int) -> list:
+    """
+    Returns [(start, end)] ranges of hours in the window with no observation,
+    leaving out hours upstream recently returned nothing for (see record_empty).
+    Adjacent missing hours are merged into one range.
+    """
+    import sqlite3
+    start_h, end_h = _hour(start_ts), _hour(end_ts)
+    cell = grid_cell(lat, lon)
+    try:
+        with _lock:
+            conn = _get_conn()
+            rows = conn.execute(
+                "SELECT ts FROM aqi_points WHERE cell = ? AND observed = 1 AND ts BETWEEN ? AND ?",
+                (cell, start_h, end_h)
+            ).fetchall()
+            rows += conn.execute(
+                "SELECT ts FROM empty_hours WHERE cell = ? AND ts BETWEEN ? AND ? AND checked > ?",
+                (cell, start_h, end_h, int(time.time()) - EMPTY_RECHECK)
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"AQI Store Error: {e}")
+        return [(start_ts, end_ts)]
+
+    have = {r[0] for r in rows}
+    ranges = []
+    for ts in range(start_h, end_h + 1, HOUR):
+        if ts in have:
+            continue
+        if ranges and ranges[-1][1] == ts - HOUR:
+            ranges[-1][1] = ts
+        else:
+            ranges.append([ts, ts])
+    return [(s, e + HOUR - 1) for s, e in ranges]
+
+def query_series(lat: float, lon: float, start_ts: int, end_ts: int, resolution: str = "daily", observed: bool = True) -> list:
+    """
+    Reads points for a cell, downsampled to 'hourly' or 'daily'.
+    Daily rows carry max/mean/min AQI in the same shape the dashboard uses.
+    """
+    import sqlite3
+    try:
+        with _lock:
+            rows = _get_conn().execute(
+                "SELECT ts, pm25, aqi FROM aqi_points WHERE cell = ? AND observed = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (grid_cell(lat, lon), int(observed), _hour(start_ts), end_ts)
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"AQI Store Error: {e}")
+        return []
+
+    if resolution == "hourly":
+        return [{"ts": ts, "pm25": pm25, "aqi": aqi} for ts, pm25, aqi in rows]
+
+    daily = {}
+    for ts, _, aqi in rows:
+        dt = datetime.fromtimestamp(ts)
+        date_str = dt.strftime('%Y-%m-%d')
+        if date_str not in daily:
+            daily[date_str] = {"day": dt.strftime('%a'), "date": date_str, "max_aqi": aqi, "min_aqi": aqi, "_sum": 0, "_n": 0}
+        day = daily[date_str]
+        day["max_aqi"] = max(day["max_aqi"], aqi)
+        day["min_aqi"] = min(day["min_aqi"], aqi)
+        day["_sum"] += aqi
+        day["_n"] += 1
+
+    result = []
+    for day in daily.values():
+        day["mean_aqi"] = int(round(day.pop("_sum") / day.pop("_n")))
+        result.append(day)
+    return result
+
+def apply_retention(now: float = None):
+    """Drops points older than RETENTION_DAYS (throttled to once per interval)."""
+    import sqlite3
+    global _last_retention
+    now = now or time.time()
+    if now - _last_retention < RETENTION_INTERVAL:
+        return
+    _last_retention = now
+    cutoff = int(now) - RETENTION_DAYS * 86400
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute("DELETE FROM aqi_points WHERE ts < ?", (cutoff,))
+            # Forecast points that are now in the past have been superseded
+            conn.execute("DELETE FROM aqi_points WHERE observed = 0 AND ts < ?", (int(now) - 86400,))
+            conn.execute("DELETE FROM empty_hours WHERE ts < ? OR checked < ?", (cutoff, int(now) - EMPTY_RECHECK))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"AQI Store Error: {e}")
@@ -0,0 +1,121 @@
+import weakref
+
+from ai_models import fastjson, profiler, quota
+from ai_models.metrics import track_upstream
+
+# Shared HTTP clients for every upstream API (OWM, WAQI, Google News, Gemini).
+# The sync helpers use one pooled requests.Session; the async helpers use one
+# httpx.AsyncClient per event loop, so thousands of in-flight upstream waits
+# share a handful of connections and no threads. Each call first takes a
+# token from the provider's quota (quota.py).
+# requests, httpx and asyncio are imported on first use to keep cold start light.
+
+class UpstreamError(Exception):
+    """An upstream call failed (network error, timeout or HTTP error status)."""
+
+_session = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+
+def _get_session():
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+def _get_async_client():
+    import asyncio
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import httpx
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+        _async_clients[loop] = client
+    return client
+
+async def aclose():
+    """Closes the async client of the running loop (call on server shutdown)."""
+    import asyncio
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+# --- Sync ---
+
+def _request(provider, method, url, timeout, **kwargs):
+    import requests
+    try:
+        quota.acquire(provider)
+    except quota.QuotaExceeded as e:
+        raise UpstreamError(f"{provider}: {e}") from e
+    with track_upstream(provider) as call, profiler.span(profiler.UPSTREAM):
+        try:
+            response = _get_session().request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            raise UpstreamError(f"{provider}: {e}") from e
+        call.status = response.status_code
+    return response
+
+def get_json(provider: str, url: str, timeout: float = 5):
+    """GETs a URL and returns the decoded JSON. Raises UpstreamError on failure."""
+    response = _request(provider, "GET", url, timeout)
+    if response.status_code >= 400:
+        raise UpstreamError(f"{provider}: HTTP {response.status_code}")
+    return fastjson.loads(response.content)
+
+def get_content(provider: str, url: str, timeout: float = 5) -> bytes:
+    """GETs a URL and returns the raw body. Raises UpstreamError on failure."""
+    response = _request(provider, "GET", url, timeout)
+    if response.status_code >= 400:
+        raise UpstreamError(f"{provider}: HTTP {response.status_code}")
+    return response.content
+
+def post_json(provider: str, url: str, payload: dict, timeout: float = 10) -> tuple:
+    """POSTs JSON and returns (status_code, decoded JSON or None)."""
+    response = _request(provider, "POST", url, timeout, json=payload)
+    try:
+        return response.status_code, fastjson.loads(response.content)
+    except ValueError:
+        return response.status_code, None
+
+# --- Async ---
+
+async def _arequest(provider, method, url, timeout, **kwargs):
+    import httpx
+    try:
+        await quota.aacquire(provider)
+    except quota.QuotaExceeded as e:
+        raise UpstreamError(f"{provider}: {e}") from e
+    with track_upstream(provider) as call, profiler.span(profiler.UPSTREAM):
+        try:
+            response = await _get_async_client().request(method, url, timeout=timeout, **kwargs)
+        except httpx.HTTPError as e:
+            raise UpstreamError(f"{provider}: {e}") from e
+        call.status = response.status_code
+    return response
+
+async def aget_json(provider: str, url: str, timeout: float = 5):
+    """Async get_json."""
+    response = await _arequest(provider, "GET", url, timeout)
+    if response.status_code >= 400:
+        raise UpstreamError(f"{provider}: HTTP {response.status_code}")
+    return fastjson.loads(response.content)
+
+async def aget_content(provider: str, url: str, timeout: float = 5) -> bytes:
+    """Async get_content."""
+    response = await _arequest(provider, "GET", url, timeout)
+    if response.status_code >= 400:
+        raise UpstreamError(f"{provider}: HTTP {response.status_code}")
+    return response.content
+
+async def apost_json(provider: str, url: str, payload: dict, timeout: float = 10) -> tuple:
+    """Async post_json."""
+    response = await _arequest(provider, "POST", url, timeout, json=payload)
+    try:
+        return response.status_code, fastjson.loads(response.content)
+    except ValueError:
+        return response.status_code, None
@@ -0,0 +1,231 @@
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+from ai_models import metrics
+from ai_models.quota import TokenBucket
+
+# Admission control for the API routes.
+# Two checks run before a request is handled:
+#   1. Per-client rate limits: token buckets per IP and per session cookie,
+#      where expensive routes cost more tokens. Over the limit -> 429.
+#   2. Per-route concurrency limits with a bounded FIFO queue. A full queue, or
+#      a queued request that waits too long, is rejected with 503 right away
+#      instead of piling up blocked workers.
+# Both carry Retry-After.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+CLIENT_LIMITS_ENABLED = os.getenv("CLIENT_RATE_LIMITS", "1") != "0"
+
+# route -> (max concurrent, max queued, max seconds queued)
+ROUTE_LIMITS = {
+    "/api/advisory": (8, 16, 5.0),                  # Gemini call per request
+    "/api/support": (8, 16, 5.0),                   # Gemini fallback outside the curated cities
+    "/api/environment/<lat>/<lon>": (32, 64, 5.0),
+    "/api/environment/batch": (4, 8, 5.0),          # Up to 100 points per request
+    "/api/forecast/<lat>/<lon>": (16, 32, 5.0),
+    "/api/news/<city>": (16, 32, 3.0),
+    "/api/geocode": (16, 32, 2.0),
+    "/api/heatmap/<int:z>/<int:x>/<int:y>.png": (8, 64, 5.0),  # A map view asks for a dozen tiles at once
+    "/api/alerts": (8, 16, 2.0),
+    "/api/alerts/<alert_id>/events": (4, 0, 0.0),   # Opening a stream; open streams are capped in alerts.py
+    "/api/alerts/evaluate": (1, 0, 0.0),            # One cycle at a time
+}
+
+# Client bucket tokens per request, by route (default 1)
+ROUTE_COSTS = {
+    "/api/advisory": 5,
+    "/api/support": 2,
+    "/api/environment/batch": 10,
+    "/api/heatmap/<int:z>/<int:x>/<int:y>.png": 0.25,  # Mostly cached, and maps fetch many
+}
+
+# (limit, period) per client. IPs get more room than sessions since NAT puts many users behind one IP.
+IP_RATE = (120, 60)
+SESSION_RATE = (60, 60)
+MAX_TRACKED_CLIENTS = 10000
+OVERLOAD_RETRY_AFTER = 2  # Seconds suggested to clients turned away by a full route
+
+SESSION_COOKIE = "breatheai_sid"
+SESSION_MAX_AGE = 30 * 86400
+# Number of trusted proxies in front of the app that append to X-Forwarded-For
+# (vercel.json sets 1). Left at 0, the header is ignored: anyone can send one.
+TRUST_PROXY_HEADERS = int(os.getenv("TRUST_PROXY_HEADERS") or "0")
+
+def client_ip(forwarded_for: str, remote_addr: str) -> str:
+    """
+    The client's IP. Behind TRUST_PROXY_HEADERS proxies, that is the address the
+    outermost trusted proxy appended to X-Forwarded-For, counting from the right;
+    entries further left are whatever the client sent.
+    """
+    if TRUST_PROXY_HEADERS > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(TRUST_PROXY_HEADERS, len(hops))]
+    return remote_addr or "unknown"
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+class _Waiter:
+    """A queued request. `wake` is called once a slot has been handed to it."""
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+class ConcurrencyLimit:
+    """
+    Counting limit with a bounded FIFO queue. A finishing request hands its slot
+    straight to the oldest waiter, which may be a thread or a coroutine.
+    """
+
+    def __init__(self, route: str, limit: int, max_queue: int, timeout: float):
+        self.route = route
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _enter(self, waiter):
+        """Returns 'run', 'queued' or 'full'."""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return "run"
+            if len(self._waiters) >= self.max_queue:
+                return "full"
+            self._waiters.append(waiter)
+            metrics.set_gauge("breatheai_admission_queue_depth", len(self._waiters), {"route": self.route})
+            return "queued"
+
+    def _give_up(self, waiter) -> bool:
+        """Called when a waiter times out. True if the slot was handed over meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            metrics.set_gauge("breatheai_admission_queue_depth", len(self._waiters), {"route": self.route})
+            return False
+
+    def acquire(self):
+        """Returns None when admitted, else the rejection reason."""
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        state = self._enter(waiter)
+        if state == "run":
+            return None
+        if state == "full":
+            return "queue_full"
+        start = time.perf_counter()
+        if event.wait(self.timeout) or self._give_up(waiter):
+            metrics.observe("breatheai_admission_wait_seconds", time.perf_counter() - start, {"route": self.route})
+            return None
+        return "queue_timeout"
+
+    async def aacquire(self):
+        """Async acquire."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = _Waiter(lambda: loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True)))
+        state = self._enter(waiter)
+        if state == "run":
+            return None
+        if state == "full":
+            return "queue_full"
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                return "queue_timeout"
+        metrics.observe("breatheai_admission_wait_seconds", time.perf_counter() - start, {"route": self.route})
+        return None
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot over; `active` stays the same
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                metrics.set_gauge("breatheai_admission_queue_depth", len(self._waiters), {"route": self.route})
+            else:
+                self.active -= 1
+                return
+        waiter.wake()
+
+LIMITS = {route: ConcurrencyLimit(route, *limit) for route, limit in ROUTE_LIMITS.items()}
+
+_clients_lock = threading.Lock()
+_clients = OrderedDict()  # ("ip"|"session", id) -> TokenBucket, least recently seen first
+
+def _take(kind: str, client_id: str, rate: tuple, cost: int) -> float:
+    """Takes `cost` tokens from the client's bucket. Returns 0 if allowed, else seconds until it would be."""
+    key = (kind, client_id)
+    with _clients_lock:
+        bucket = _clients.get(key)
+        if bucket is None:
+            bucket = _clients[key] = TokenBucket(*rate)
+            if len(_clients) > MAX_TRACKED_CLIENTS:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(key)
+        bucket.refill(time.monotonic())
+        if bucket.tokens < cost:
+            return bucket.wait_for(cost)
+        bucket.tokens -= cost
+        return 0.0
+
+def _reject(route: str, reason: str, retry_after: float) -> tuple:
+    metrics.inc("breatheai_admission_rejected_total", {"route": route, "reason": reason})
+    status = 429 if reason.startswith("rate_") else 503
+    return status, max(1, math.ceil(retry_after)), reason
+
+def check_client(route: str, ip: str, session_id: str = None):
+    """
+    Per-client rate limits. Returns None if allowed, else (status, retry_after, reason).
+    Only routes with a concurrency limit (the API routes) are rate limited.
+    """
+    if not ADMISSION_ENABLED or not CLIENT_LIMITS_ENABLED or route not in ROUTE_LIMITS:
+        return None
+    cost = ROUTE_COSTS.get(route, 1)
+    wait = _take("ip", ip, IP_RATE, cost)
+    if wait:
+        return _reject(route, "rate_ip", wait)
+    if session_id:
+        wait = _take("session", session_id, SESSION_RATE, cost)
+        if wait:
+            return _reject(route, "rate_session", wait)
+    return None
+
+def acquire_slot(route: str):
+    """Waits for a concurrency slot. Returns None if admitted, else (status, retry_after, reason)."""
+    limit = LIMITS.get(route) if ADMISSION_ENABLED else None
+    if limit is None:
+        return None
+    reason = limit.acquire()
+    return _reject(route, reason, OVERLOAD_RETRY_AFTER) if reason else None
+
+async def aacquire_slot(route: str):
+    """Async acquire_slot."""
+    limit = LIMITS.get(route) if ADMISSION_ENABLED else None
+    if limit is None:
+        return None
+    reason = await limit.aacquire()
+    return _reject(route, reason, OVERLOAD_RETRY_AFTER) if reason else None
+
+def release_slot(route: str):
+    """Releases a slot taken by a successful acquire_slot/aacquire_slot."""
+    limit = LIMITS.get(route) if ADMISSION_ENABLED else None
+    if limit is not None:
+        limit.release()
+
+def rejection_body(reason: str, retry_after: int) -> dict:
+    message = "Too many requests" if reason.startswith("rate_") else "Server busy"
+    return {"error": f"{message}, retry in {retry_after}s", "retry_after": retry_after}
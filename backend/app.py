@@ -1,23 +1,31 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g, Response, url_for
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import parse_accept_header, parse_etags
 # Flask is a micro-framework that allows us to build web applications in Python.
 # render_template: Sends HTML files to the user.
 # request: Handles incoming data (like city name).
 # jsonify: Converts Python dictionaries to JSON format (for APIs).
 
+import hashlib
+import hmac
+import json
+import mimetypes
 import os
 import sys
 import time
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Add root directory to path to find ai_models
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from ai_models.environment import get_environment_data, get_aqi_history, get_aqi_forecast, get_coordinates, calculate_cigarettes
-from ai_models.advisory import get_health_advice, get_emergency_info
+from ai_models.environment import get_environment_data, get_aqi_history, get_forecast_series, get_coordinates, calculate_cigarettes
+from ai_models.forecast import forecast_summary
+from ai_models.advisory import get_health_advice, get_emergency_info, DEFAULT_EMERGENCY_INFO
 from ai_models.planner import generate_daily_plan, analyze_forecast
 from ai_models.news import get_pollution_news
+from ai_models.batch import get_batch_environment, parse_batch_request
+from ai_models import alerts, fastjson, heatmap, metrics, profiler
+from ai_models.upstream import UpstreamError
+from backend import admission
 # New Feature Import
 
 
@@ -25,27 +33,281 @@ from ai_models.news import get_pollution_news
 CACHE = {}
 CACHE_DURATION = 600  # 10 minutes in seconds
 
-def get_from_cache(key):
-    """Retrieve data from cache if valid."""
+# Server-side TTL per cache (the cache key prefix), in seconds
+CACHE_TTLS = {
+    "env": CACHE_DURATION,
+    "news": 1800,         # Headlines move slowly
+    "support": 86400,     # Emergency numbers are effectively static
+    "geocode": 7 * 86400,
+}
+
+# HTTP caching per cache: (browser max-age cap, stale-while-revalidate), in seconds.
+# The CDN (s-maxage) keeps a response for whatever is left of the server-side TTL,
+# and browsers revalidate with If-None-Match after their shorter max-age.
+HTTP_CACHE_POLICY = {
+    "env": (60, 300),
+    "news": (300, 1800),
+    "support": (3600, 86400),
+    "geocode": (86400, 86400),
+}
+
+def _cache_kind(key):
+    return key.split('_', 1)[0]
+
+def get_cache_entry(key):
+    """Retrieve a cache entry ({data, timestamp, etag}) if valid."""
+    kind = _cache_kind(key)
     if key in CACHE:
         entry = CACHE[key]
-        if time.time() - entry['timestamp'] < CACHE_DURATION:
+        if time.time() - entry['timestamp'] < CACHE_TTLS.get(kind, CACHE_DURATION):
             print(f"⚡ Serving {key} from cache")
-            return entry['data']
+            metrics.record_cache(kind, True)
+            return entry
         else:
             del CACHE[key]  # Expired
+    metrics.record_cache(kind, False)
     return None
 
+def get_from_cache(key):
+    """Retrieve data from cache if valid."""
+    entry = get_cache_entry(key)
+    return entry['data'] if entry else None
+
 def save_to_cache(key, data):
-    """Save data to cache with timestamp."""
-    CACHE[key] = {'data': data, 'timestamp': time.time()}
+    """
+    Save data to cache with timestamp, along with its encoded response body
+    (and a gzipped copy), so cache hits are served without re-encoding.
+    The entry's version (a hash of the body) is the ETag, so every instance
+    hands out the same ETag for the same data.
+    """
+    body = fastjson.dumps(data) + b"\n"
+    entry = {
+        'data': data, 'timestamp': time.time(), 'etag': hashlib.sha1(body).hexdigest()[:20],
+        'body': body, 'gzip': fastjson.gzip_body(body),
+    }
+    CACHE[key] = entry
+    return entry
+
+def cache_headers(key, entry):
+    """ETag and Cache-Control headers for a response served from a cache entry."""
+    kind = _cache_kind(key)
+    browser_max_age, stale_while_revalidate = HTTP_CACHE_POLICY[kind]
+    remaining = max(0, int(entry['timestamp'] + CACHE_TTLS[kind] - time.time()))
+    return {
+        "ETag": f'W/"{entry["etag"]}"',
+        "Cache-Control": f"public, max-age={min(browser_max_age, remaining)}, s-maxage={remaining}, "
+                         f"stale-while-revalidate={stale_while_revalidate}",
+        "Vary": "Accept-Encoding",
+    }
+
+def etag_matches(if_none_match, entry):
+    """True if an If-None-Match header value already names this entry's version."""
+    return bool(if_none_match) and parse_etags(if_none_match).contains_weak(entry['etag'])
+
+def cached_body(entry, accept_encoding):
+    """(body, content encoding) for a cache entry: the gzipped copy if the client accepts it."""
+    if entry['gzip'] is not None and parse_accept_header(accept_encoding)["gzip"]:
+        return entry['gzip'], 'gzip'
+    return entry['body'], None
+
+def cached_json(key, entry):
+    """JSON response for a cache entry, or 304 Not Modified if the client's copy is current."""
+    headers = cache_headers(key, entry)
+    if etag_matches(request.headers.get("If-None-Match"), entry):
+        return Response(status=304, headers=headers)
+    body, encoding = cached_body(entry, request.headers.get("Accept-Encoding"))
+    response = Response(body, mimetype="application/json", headers=headers)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Routes jsonify and request.get_json through ai_models.fastjson (orjson when installed)."""
+
+    def dumps(self, obj, **kwargs):
+        return fastjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return fastjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(fastjson.dumps(obj) + b"\n", mimetype=self.mimetype)
+
 # Configure Flask to use paths in ../frontend
 app = Flask(__name__, 
             template_folder='../frontend/templates',
             static_folder='../frontend/static')
+app.json = FastJSONProvider(app)
+
+# --- Static Assets ---
+# `python -m backend.build_assets` writes fingerprinted, precompressed copies of
+# frontend/static and assets/ to frontend/dist with a manifest. Without a build,
+# asset_url falls back to the original files.
+DIST_DIR = os.path.join(os.path.dirname(app.root_path), 'frontend', 'dist')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MANIFEST_CACHE = 'no-cache'  # manifest.json keeps its name across builds
+
+def _load_asset_manifest():
+    try:
+        with open(os.path.join(DIST_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+ASSET_MANIFEST = _load_asset_manifest()
+
+@app.template_global()
+def asset_url(name, width=None):
+    """
+    URL for a frontend file by logical name, e.g. asset_url('static/css/style.css')
+    or asset_url('assets/favicon.jpg', width=64) for the smallest variant at least that wide.
+    """
+    if ASSET_MANIFEST and name in ASSET_MANIFEST['files']:
+        hashed = ASSET_MANIFEST['files'][name]
+        if width:
+            variants = ASSET_MANIFEST['widths'].get(name, {})
+            fitting = [int(w) for w in variants if int(w) >= width]
+            if fitting:
+                hashed = variants[str(min(fitting))]
+        return url_for('serve_dist', filename=hashed)
+
+    prefix, filename = name.split('/', 1)
+    return url_for('static' if prefix == 'static' else 'serve_assets', filename=filename)
+
+# --- Response Builders (shared with the async server in asgi.py) ---
+
+def build_environment_response(env_data, forecast_series, history_data):
+    """Assembles the /api/environment payload from the raw fetches."""
+    with profiler.span(profiler.AQI):
+        return _build_environment_response(env_data, forecast_series, history_data)
+
+def _build_environment_response(env_data, forecast_series, history_data):
+    # Calculate Cigarettes
+    pm25 = env_data.get('pollutants', {}).get('PM2.5', {}).get('concentration', 0)
+    cig_count = calculate_cigarettes(pm25)
+    
+    forecast_data = forecast_series["daily"][:5] if forecast_series else []
+    try:
+        forecast_analysis = analyze_forecast(forecast_data, forecast_series)
+    except Exception as e:
+        forecast_analysis = {}
+
+    return {
+        "environment": env_data,
+        "cigarette_equivalent": cig_count,
+        "sources": [], # Will be fetched via /api/advisory
+        "source_narrative": "Loading analysis...",
+        "forecast": forecast_data,
+        "history": history_data,
+        "forecast_analysis": forecast_analysis,
+        "health_advice": None, # Signal frontend to fetch AI
+        "daily_plan": None,
+        "news": [], # Fetched via /api/news
+        "emergency_info": None # Fetched via /api/support
+    }
+
+def build_advisory_response(env_data, ai_result):
+    """Assembles the /api/advisory payload from the AI result."""
+    # Daily Plan
+    try:
+        plan = generate_daily_plan(env_data, ai_data=ai_result)
+    except Exception as e:
+        plan = {}
+
+    return {
+        "health_advice": ai_result.get("assessment", "Analysis unavailable."),
+        "sources": ai_result.get("sources", []),
+        "source_narrative": ai_result.get("source_narrative", "Source analysis unavailable."),
+        "daily_plan": plan
+    }
+
+# --- Instrumentation ---
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+    g.route = _route_label()
+    metrics.add_gauge("breatheai_http_requests_in_flight", 1, {"route": g.route})
+
+@app.after_request
+def record_request(response):
+    labels = {"route": g.route}
+    metrics.observe("breatheai_http_request_duration_seconds", time.perf_counter() - g.start_time, labels)
+    metrics.inc("breatheai_http_requests_total", {"route": g.route, "status": response.status_code})
+    if not response.direct_passthrough:
+        metrics.observe("breatheai_http_response_size_bytes", response.calculate_content_length() or 0, labels, buckets=metrics.SIZE_BUCKETS)
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    if g.get("holds_slot"):
+        admission.release_slot(g.route)
+    if "route" in g:
+        metrics.add_gauge("breatheai_http_requests_in_flight", -1, {"route": g.route})
+
+# --- Admission Control (see admission.py) ---
+
+def rejection_response(status, retry_after, reason):
+    response = jsonify(admission.rejection_body(reason, retry_after))
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.before_request
+def admit_request():
+    ip = admission.client_ip(request.headers.get('X-Forwarded-For'), request.remote_addr)
+    rejection = admission.check_client(g.route, ip, request.cookies.get(admission.SESSION_COOKIE))
+    if rejection is None:
+        rejection = admission.acquire_slot(g.route)
+        g.holds_slot = rejection is None
+    if rejection:
+        return rejection_response(*rejection)
+
+SESSION_PAGES = {'home', 'news_page', 'support_page'}
+
+@app.after_request
+def issue_session(response):
+    # Pages only: API responses (including bodyless 304s) stay cookie-free so the CDN can cache them
+    if (request.endpoint in SESSION_PAGES and response.status_code == 200
+            and admission.SESSION_COOKIE not in request.cookies):
+        response.set_cookie(admission.SESSION_COOKIE, admission.new_session_id(), max_age=admission.SESSION_MAX_AGE,
+                            httponly=True, samesite='Lax', secure=request.is_secure)
+    return response
+
+# --- Profiling (opt-in, see ai_models/profiler.py) ---
+
+@app.before_request
+def start_profile():
+    g.profile = profiler.maybe_start(g.route, request.headers.get(profiler.TOKEN_HEADER),
+                                     request.headers.get(profiler.FORMAT_HEADER))
+
+@app.after_request
+def finish_profile(response):
+    profile = g.get("profile")
+    if profile is not None:
+        profile.finish()
+        if profile.requested:
+            response.headers["Server-Timing"] = profile.server_timing()
+    return response
+
+@app.teardown_request
+def stop_profile(exc):
+    # Errors skip after_request
+    if g.get("profile") is not None:
+        g.profile.finish()
 
 # --- Routes ---
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
     # Serve from the root 'assets' folder
@@ -54,6 +316,35 @@ def serve_assets(filename):
     response.headers['Cache-Control'] = 'public, max-age=86400' # Cache for 1 day
     return response
 
+@app.route('/dist/<path:filename>')
+def serve_dist(filename):
+    """
+    Fingerprinted build output, cached forever. Negotiates the precompressed
+    (br/gzip) or WebP representation the client accepts.
+    """
+    alternates = ASSET_MANIFEST['alternates'].get(filename, {}) if ASSET_MANIFEST else {}
+    served, encoding, vary = filename, None, None
+    mimetype = mimetypes.guess_type(filename)[0]
+
+    # Only an explicit image/webp counts (*/* doesn't mean the browser decodes WebP)
+    if 'webp' in alternates:
+        vary = 'Accept'
+        if 'image/webp' in request.headers.get('Accept', ''):
+            served, mimetype = alternates['webp'], 'image/webp'
+    elif alternates:
+        vary = 'Accept-Encoding'
+        encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in alternates])
+        if encoding:
+            served = alternates[encoding]
+
+    response = send_from_directory(DIST_DIR, served, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if vary:
+        response.headers['Vary'] = vary
+    response.headers['Cache-Control'] = MANIFEST_CACHE if filename == 'manifest.json' else IMMUTABLE_CACHE
+    return response
+
 @app.route('/favicon.ico')
 def favicon():
     # Serve from assets/favicon.jpg
@@ -80,9 +371,16 @@ def geocode():
     
     if not city:
         return jsonify({"error": "City is required"}), 400
-        
+
+    cache_key = f"geocode_{city}_{country}"
+    entry = get_cache_entry(cache_key)
+    if entry:
+        return cached_json(cache_key, entry)
+
     locations = get_coordinates(city, country)
-    return jsonify(locations)
+    if not locations:
+        return jsonify(locations)  # Unknown city or upstream failure: don't cache
+    return cached_json(cache_key, save_to_cache(cache_key, locations))
 
 @app.route("/api/environment/<lat>/<lon>")
 def get_env(lat, lon):
@@ -97,56 +395,62 @@ def get_env(lat, lon):
         cache_key = f"env_{lat}_{lon}_{override_city}"
         
         # Try Cache
-        cached_result = get_from_cache(cache_key)
-        if cached_result:
-            return jsonify(cached_result)
+        entry = get_cache_entry(cache_key)
+        if entry:
+            return cached_json(cache_key, entry)
 
         # Raw data
         env_data = get_environment_data(lat, lon, override_city=override_city)
-        # Calculate Cigarettes
-        pm25 = env_data.get('pollutants', {}).get('PM2.5', {}).get('concentration', 0)
-        cig_count = calculate_cigarettes(pm25)
-        
-        forecast_data = get_aqi_forecast(lat, lon)
+        forecast_series = get_forecast_series(lat, lon)
         history_data = get_aqi_history(lat, lon)
         
     except Exception as e:
         return jsonify({"error": f"Environment data error: {str(e)}"}), 500
 
-    # Initialize empty variables for AI
-    ai_result = {}
-    health_text = "Analysis pending..." # Placeholder
-    plan = {}
+    response_data = build_environment_response(env_data, forecast_series, history_data)
+    
+    # Save to Cache
+    entry = save_to_cache(cache_key, response_data)
     
-    # Emergency Info - Fetched via /api/support
-    emergency_info = None
+    return cached_json(cache_key, entry)
 
-    # News - Fetched via /api/news
-    news_data = []
+@app.route("/api/environment/batch", methods=['POST'])
+def get_env_batch():
+    """
+    Weather/AQI/forecast/history for many points in one call.
+    Body: {"points": [[lat, lon], ...], "sections": ["aqi", ...], "deadline": seconds}
+    """
+    try:
+        points, sections, deadline = parse_batch_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(get_batch_environment(points, sections, deadline))
 
+@app.route("/api/forecast/<lat>/<lon>")
+def get_forecast(lat, lon):
+    """
+    Hourly AQI forecast with daily rollups, best outdoor windows and worst hours.
+    """
     try:
-        forecast_analysis = analyze_forecast(forecast_data)
+        series = get_forecast_series(float(lat), float(lon))
+        return jsonify(forecast_summary(series))
     except Exception as e:
-        forecast_analysis = {}
+        return jsonify({"error": f"Forecast error: {str(e)}"}), 500
 
-    response_data = {
-        "environment": env_data,
-        "cigarette_equivalent": cig_count,
-        "sources": [], # Will be fetched via /api/advisory
-        "source_narrative": "Loading analysis...",
-        "forecast": forecast_data,
-        "history": history_data,
-        "forecast_analysis": forecast_analysis,
-        "health_advice": None, # Signal frontend to fetch AI
-        "daily_plan": None,
-        "news": news_data,
-        "emergency_info": emergency_info
-    }
-    
-    # Save to Cache
-    save_to_cache(cache_key, response_data)
-    
-    return jsonify(response_data)
+@app.route("/api/heatmap/<int:z>/<int:x>/<int:y>.png")
+def heatmap_tile(z, x, y):
+    """AQI heatmap map tile (z/x/y), for a map overlay."""
+    try:
+        png, max_age = heatmap.get_tile(z, x, y)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except ImportError:
+        return jsonify({"error": "Heatmap unavailable (numpy is not installed)"}), 503
+    except UpstreamError as e:
+        return jsonify({"error": f"Station data error: {str(e)}"}), 502
+    response = Response(png, mimetype="image/png")
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, s-maxage={max_age}"
+    return response
 
 @app.route('/api/advisory', methods=['POST'])
 def get_advisory():
@@ -165,18 +469,7 @@ def get_advisory():
         except Exception as e:
             ai_result = {"assessment": "Analysis failed.", "sources": [], "source_narrative": "Unavailable."}
 
-        # Daily Plan
-        try:
-            plan = generate_daily_plan(env_data, ai_data=ai_result)
-        except Exception as e:
-            plan = {}
-
-        return jsonify({
-            "health_advice": ai_result.get("assessment", "Analysis unavailable."),
-            "sources": ai_result.get("sources", []),
-            "source_narrative": ai_result.get("source_narrative", "Source analysis unavailable."),
-            "daily_plan": plan
-        })
+        return jsonify(build_advisory_response(env_data, ai_result))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -186,9 +479,16 @@ def get_city_news(city):
         limit = request.args.get('limit', default=5, type=int)
         # Cap limit to prevent abuse/timeouts
         if limit > 100: limit = 100
-        
+
+        cache_key = f"news_{city}_{limit}"
+        entry = get_cache_entry(cache_key)
+        if entry:
+            return cached_json(cache_key, entry)
+
         news = get_pollution_news(city, limit=limit)
-        return jsonify(news)
+        if not news:
+            return jsonify(news)  # Feed unavailable: don't cache
+        return cached_json(cache_key, save_to_cache(cache_key, news))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -200,10 +500,68 @@ def get_support_info():
     
     if not city:
         return jsonify({"error": "City required"}), 400
-        
+
+    cache_key = f"support_{city}_{country}"
+    entry = get_cache_entry(cache_key)
+    if entry:
+        return cached_json(cache_key, entry)
+
     info = get_emergency_info(city, country)
-    return jsonify(info)
+    if info == DEFAULT_EMERGENCY_INFO:
+        return jsonify(info)  # Lookup failed: don't cache the generic fallback
+    return cached_json(cache_key, save_to_cache(cache_key, info))
 
+@app.route('/api/alerts', methods=['POST'])
+def create_alert():
+    """
+    Subscribes to an AQI threshold alert.
+    Body: lat, lon, threshold, optional pollutant, horizon_hours, sink (local/webhook/sse) and target.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    try:
+        alert = alerts.create_alert(
+            body.get("lat"), body.get("lon"), body.get("threshold"),
+            pollutant=body.get("pollutant", "aqi"), horizon_hours=body.get("horizon_hours", 0),
+            sink=body.get("sink", "local"), target=body.get("target"),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(alert), 201
+
+@app.route('/api/alerts/<alert_id>', methods=['GET', 'DELETE'])
+def manage_alert(alert_id):
+    if request.method == 'DELETE':
+        if not alerts.delete_alert(alert_id):
+            return jsonify({"error": "Alert not found"}), 404
+        return '', 204
+    alert = alerts.get_alert(alert_id)
+    if not alert:
+        return jsonify({"error": "Alert not found"}), 404
+    return jsonify(alert)
+
+@app.route('/api/alerts/<alert_id>/events')
+def alert_events(alert_id):
+    """Server-sent events for an alert subscribed with the 'sse' sink."""
+    if not alerts.get_alert(alert_id):
+        return jsonify({"error": "Alert not found"}), 404
+    if alerts.sse_streams_full():
+        return rejection_response(503, admission.OVERLOAD_RETRY_AFTER, "sse_streams")
+    return Response(alerts.sse_stream(alert_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@app.route('/api/alerts/evaluate', methods=['GET', 'POST'])
+def evaluate_alerts():
+    """
+    Runs an alert evaluation cycle (called by a scheduler, e.g. a cron job).
+    When CRON_SECRET is set, requires it as a bearer token and always runs the cycle;
+    otherwise cycles are throttled to one per alerts.MIN_CYCLE_INTERVAL.
+    """
+    secret = os.getenv("CRON_SECRET")
+    if secret and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {secret}"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(alerts.evaluate(force=bool(secret)))
 
 
 if __name__ == "__main__":
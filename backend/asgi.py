@@ -0,0 +1,241 @@
+"""
+Async serving mode.
+
+    uvicorn backend.asgi:app --workers 2
+
+The API routes that wait on upstream APIs run natively on the event loop
+using the async ai_models fetchers, so a slow Gemini call holds a coroutine
+instead of a worker thread. Everything else (pages, static files, /metrics)
+is handed to the Flask app.
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+import traceback
+from urllib.parse import parse_qs, unquote
+
+# Add root directory to path to find ai_models
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_cookie
+
+from backend.app import (app as flask_app, get_cache_entry, save_to_cache, cache_headers, etag_matches, cached_body,
+                         build_environment_response, build_advisory_response)
+from ai_models.environment import aget_environment_data, aget_forecast_series, aget_aqi_history, aget_coordinates
+from ai_models.advisory import aget_health_advice, aget_emergency_info, DEFAULT_EMERGENCY_INFO
+from ai_models.news import aget_pollution_news
+from ai_models.batch import aget_batch_environment, parse_batch_request
+from ai_models import fastjson, metrics, profiler, upstream
+from backend import admission
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+# --- Handlers: (path params, query, json body) -> (status, payload, cache) ---
+# `cache` is (key, entry) when the payload came from or went into the response
+# cache, so the response gets ETag/Cache-Control headers (and 304s).
+
+async def environment(params, query, body):
+    lat, lon = params["lat"], params["lon"]
+    try:
+        # Check for city override (e.g. from IP geolocation)
+        override_city = query.get("city")
+
+        # Cache Key: Combine lat, lon, and city
+        cache_key = f"env_{lat}_{lon}_{override_city}"
+        entry = get_cache_entry(cache_key)
+        if entry:
+            return 200, entry["data"], (cache_key, entry)
+
+        env_data, forecast_series, history_data = await asyncio.gather(
+            aget_environment_data(lat, lon, override_city=override_city),
+            aget_forecast_series(lat, lon),
+            aget_aqi_history(lat, lon),
+        )
+    except Exception as e:
+        return 500, {"error": f"Environment data error: {str(e)}"}, None
+
+    response_data = build_environment_response(env_data, forecast_series, history_data)
+    return 200, response_data, (cache_key, save_to_cache(cache_key, response_data))
+
+async def environment_batch(params, query, body):
+    try:
+        points, sections, deadline = parse_batch_request(body)
+    except ValueError as e:
+        return 400, {"error": str(e)}, None
+    return 200, await aget_batch_environment(points, sections, deadline), None
+
+async def advisory(params, query, body):
+    if not body:
+        return 400, {"error": "No environment data provided"}, None
+    try:
+        ai_result = await aget_health_advice(body)
+    except Exception as e:
+        ai_result = {"assessment": "Analysis failed.", "sources": [], "source_narrative": "Unavailable."}
+    return 200, build_advisory_response(body, ai_result), None
+
+async def news(params, query, body):
+    city = params["city"]
+    try:
+        limit = int(query.get("limit", 5))
+    except ValueError:
+        limit = 5
+    # Cap limit to prevent abuse/timeouts
+    limit = min(limit, 100)
+
+    cache_key = f"news_{city}_{limit}"
+    entry = get_cache_entry(cache_key)
+    if entry:
+        return 200, entry["data"], (cache_key, entry)
+
+    items = await aget_pollution_news(city, limit=limit)
+    if not items:
+        return 200, items, None  # Feed unavailable: don't cache
+    return 200, items, (cache_key, save_to_cache(cache_key, items))
+
+async def geocode(params, query, body):
+    city, country = query.get("city"), query.get("country")
+    if not city:
+        return 400, {"error": "City is required"}, None
+
+    cache_key = f"geocode_{city}_{country}"
+    entry = get_cache_entry(cache_key)
+    if entry:
+        return 200, entry["data"], (cache_key, entry)
+
+    locations = await aget_coordinates(city, country)
+    if not locations:
+        return 200, locations, None  # Unknown city or upstream failure: don't cache
+    return 200, locations, (cache_key, save_to_cache(cache_key, locations))
+
+async def support(params, query, body):
+    city, country = query.get("city"), query.get("country")
+    if not city:
+        return 400, {"error": "City required"}, None
+
+    cache_key = f"support_{city}_{country}"
+    entry = get_cache_entry(cache_key)
+    if entry:
+        return 200, entry["data"], (cache_key, entry)
+
+    info = await aget_emergency_info(city, country)
+    if info == DEFAULT_EMERGENCY_INFO:
+        return 200, info, None  # Lookup failed: don't cache the generic fallback
+    return 200, info, (cache_key, save_to_cache(cache_key, info))
+
+# (method, path pattern, route label for metrics, handler)
+ROUTES = [
+    ("GET", re.compile(r"^/api/environment/(?P<lat>[^/]+)/(?P<lon>[^/]+)$"), "/api/environment/<lat>/<lon>", environment),
+    ("POST", re.compile(r"^/api/environment/batch$"), "/api/environment/batch", environment_batch),
+    ("POST", re.compile(r"^/api/advisory$"), "/api/advisory", advisory),
+    ("GET", re.compile(r"^/api/news/(?P<city>[^/]+)$"), "/api/news/<city>", news),
+    ("GET", re.compile(r"^/api/geocode$"), "/api/geocode", geocode),
+    ("GET", re.compile(r"^/api/support$"), "/api/support", support),
+]
+
+# --- ASGI plumbing ---
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def _send_json(send, status, payload, cache=None, if_none_match=None, accept_encoding=None, extra=()):
+    """
+    Sends a JSON response (or a 304 for a current cached copy). Cached payloads
+    are sent as their stored bytes, gzipped if the client accepts it.
+    Returns (status, body size).
+    """
+    extra = list(extra)
+    if cache is not None:
+        key, entry = cache
+        extra += [(k.lower().encode(), v.encode()) for k, v in cache_headers(key, entry).items()]
+        if etag_matches(if_none_match, entry):
+            await send({"type": "http.response.start", "status": 304, "headers": extra})
+            await send({"type": "http.response.body", "body": b""})
+            return 304, 0
+        body, encoding = cached_body(entry, accept_encoding)
+        if encoding:
+            extra.append((b"content-encoding", encoding.encode()))
+    else:
+        body = fastjson.dumps(payload) + b"\n"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + extra,
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status, len(body)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await upstream.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    if scope["type"] == "http":
+        for method, pattern, label, handler in ROUTES:
+            match = pattern.match(scope["path"])
+            if match and scope["method"] == method:
+                params = {k: unquote(v) for k, v in match.groupdict().items()}
+                query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+                return await _dispatch(label, handler, params, query, scope, receive, send)
+
+    await wsgi_app(scope, receive, send)
+
+async def _dispatch(label, handler, params, query, scope, receive, send):
+    labels = {"route": label}
+    headers = dict(scope["headers"])
+    start = time.perf_counter()
+    metrics.add_gauge("breatheai_http_requests_in_flight", 1, labels)
+    try:
+        # Admission control (see admission.py)
+        ip = admission.client_ip(headers.get(b"x-forwarded-for", b"").decode(), (scope.get("client") or ("",))[0])
+        session_id = parse_cookie(headers.get(b"cookie", b"").decode()).get(admission.SESSION_COOKIE)
+        rejection = admission.check_client(label, ip, session_id) or await admission.aacquire_slot(label)
+        if rejection:
+            status, retry_after, reason = rejection
+            status, size = await _send_json(send, status, admission.rejection_body(reason, retry_after),
+                                            extra=[(b"retry-after", str(retry_after).encode()), (b"cache-control", b"no-store")])
+        else:
+            # Samples the event loop thread, so concurrent requests show up in the stacks too
+            profile = profiler.maybe_start(label, headers.get(profiler.TOKEN_HEADER.lower().encode(), b"").decode(),
+                                           headers.get(profiler.FORMAT_HEADER.lower().encode(), b"").decode())
+            try:
+                raw = await _read_body(receive)
+                try:
+                    body = fastjson.loads(raw) if raw else None
+                except ValueError:
+                    status, payload, cache = 400, {"error": "Invalid JSON body"}, None
+                else:
+                    try:
+                        status, payload, cache = await handler(params, query, body)
+                    except Exception:
+                        print(f"ASGI Handler Error ({label}):")
+                        traceback.print_exc()
+                        status, payload, cache = 500, {"error": "Internal server error"}, None
+                extra = [(b"server-timing", profile.server_timing().encode())] if profile and profile.requested else []
+                status, size = await _send_json(send, status, payload, cache, headers.get(b"if-none-match", b"").decode(),
+                                                headers.get(b"accept-encoding", b"").decode(), extra)
+            finally:
+                admission.release_slot(label)
+                if profile is not None:
+                    profile.finish()
+        metrics.observe("breatheai_http_request_duration_seconds", time.perf_counter() - start, labels)
+        metrics.inc("breatheai_http_requests_total", {"route": label, "status": status})
+        metrics.observe("breatheai_http_response_size_bytes", size, labels, buckets=metrics.SIZE_BUCKETS)
+    finally:
+        metrics.add_gauge("breatheai_http_requests_in_flight", -1, labels)
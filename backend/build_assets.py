@@ -0,0 +1,186 @@
+"""
+Static asset build: fingerprinted, precompressed copies of the frontend files
+(the ones in SOURCES).
+
+    python -m backend.build_assets
+
+Writes frontend/dist/ plus a manifest.json that app.py reads at startup. Every
+file gets a content hash in its name, so it can be served with `immutable`
+caching. Text files get .gz (and .br when the `brotli` package is installed)
+siblings, and images get WebP siblings and resized variants (when `Pillow` is
+installed). Without a build, the app serves the original files.
+
+The output is committed (Vercel deploys the repo as-is and runs no build
+step), so rebuild and commit it whenever a file it covers changes;
+`--check` exits non-zero when it is stale.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DIST_DIR = os.path.join(ROOT, "frontend", "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# Logical name prefix -> (source directory, files to build or None for all).
+# Templates use e.g. 'static/css/style.css'. Only files the pages link to are
+# built: assets/ also holds the README screenshots, which the app never serves.
+SOURCES = {
+    "static": (os.path.join(ROOT, "frontend", "static"), None),
+    "assets": (os.path.join(ROOT, "assets"), {"favicon.jpg"}),
+}
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+IMAGES = {".jpg", ".jpeg", ".png"}
+IMAGE_WIDTHS = (64, 192, 640, 1280)  # Favicon sizes and screenshot widths
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+def _fingerprint(rel_path: str, content: bytes) -> str:
+    """'assets/favicon.jpg' -> 'assets/favicon.1a2b3c4d5e.jpg'"""
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+def _write(rel_path: str, content: bytes):
+    path = os.path.join(DIST_DIR, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+def _compress(hashed: str, content: bytes, brotli) -> dict:
+    """Writes .gz/.br siblings when they are actually smaller. Returns {encoding: path}."""
+    alternates = {}
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        _write(hashed + ".gz", gz)
+        alternates["gzip"] = hashed + ".gz"
+    if brotli is not None:
+        br = brotli.compress(content, quality=11)
+        if len(br) < len(content):
+            _write(hashed + ".br", br)
+            alternates["br"] = hashed + ".br"
+    return alternates
+
+def _save_image(image, rel_path: str, fmt: str):
+    path = os.path.join(DIST_DIR, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "WEBP":
+        image.save(path, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif fmt == "JPEG":
+        image.convert("RGB").save(path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, fmt, optimize=True)
+
+def _image_variants(source: str, hashed: str, manifest: dict, Image):
+    """WebP sibling of the full image, plus resized copies (each with its own WebP sibling)."""
+    stem, ext = os.path.splitext(hashed)
+    with Image.open(source) as image:
+        fmt = image.format
+        image.load()
+        webp = stem + ".webp"
+        _save_image(image, webp, "WEBP")
+        manifest["alternates"].setdefault(hashed, {})["webp"] = webp
+
+        widths = {}
+        for width in IMAGE_WIDTHS:
+            if width >= image.width:
+                break
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            variant = f"{stem}.{width}w{ext}"
+            _save_image(resized, variant, fmt)
+            _save_image(resized, f"{stem}.{width}w.webp", "WEBP")
+            manifest["alternates"][variant] = {"webp": f"{stem}.{width}w.webp"}
+            widths[str(width)] = variant
+        return widths
+
+def build(verbose: bool = True) -> dict:
+    """Rebuilds frontend/dist and returns the manifest."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("brotli not installed: skipping .br files (pip install brotli)")
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+        print("Pillow not installed: skipping WebP and resized images (pip install Pillow)")
+
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    # files: logical name -> hashed path, widths: logical name -> {width: hashed path},
+    # alternates: hashed path -> {encoding or 'webp': path of the alternate representation}
+    manifest = {"files": {}, "widths": {}, "alternates": {}}
+    for name, source in _sources():
+        ext = os.path.splitext(source)[1].lower()
+        with open(source, "rb") as f:
+            content = f.read()
+
+        hashed = _fingerprint(name, content)
+        _write(hashed, content)
+        manifest["files"][name] = hashed
+        if ext in COMPRESSIBLE:
+            alternates = _compress(hashed, content, brotli)
+            if alternates:
+                manifest["alternates"][hashed] = alternates
+        elif ext in IMAGES and Image is not None:
+            widths = _image_variants(source, hashed, manifest, Image)
+            if widths:
+                manifest["widths"][name] = widths
+
+        if verbose:
+            sizes = {k: os.path.getsize(os.path.join(DIST_DIR, v)) for k, v in manifest["alternates"].get(hashed, {}).items()}
+            print(f"{name} -> {hashed} ({len(content)} bytes" + "".join(f", {k} {v}" for k, v in sizes.items()) + ")")
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def _sources():
+    """Yields (logical name, source path) for every file the build covers."""
+    for prefix, (source_dir, allowed) in SOURCES.items():
+        for dirpath, _, filenames in os.walk(source_dir):
+            for filename in sorted(filenames):
+                source = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(source, source_dir).replace(os.sep, "/")
+                if allowed is None or rel_path in allowed:
+                    yield prefix + "/" + rel_path, source
+
+def check() -> list:
+    """Problems that make the committed build stale (empty when it is current)."""
+    try:
+        with open(MANIFEST_PATH) as f:
+            files = json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return ["no manifest: run python -m backend.build_assets"]
+    problems = []
+    for name, source in _sources():
+        with open(source, "rb") as f:
+            hashed = _fingerprint(name, f.read())
+        if files.get(name) != hashed:
+            problems.append(f"{name}: changed since the last build")
+        elif not os.path.exists(os.path.join(DIST_DIR, hashed)):
+            problems.append(f"{name}: {hashed} missing from {os.path.relpath(DIST_DIR, ROOT)}")
+    names = {name for name, _ in _sources()}
+    problems.extend(f"{name}: deleted since the last build" for name in sorted(set(files) - names))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets into frontend/dist.")
+    parser.add_argument("--quiet", action="store_true", help="Only print warnings")
+    parser.add_argument("--check", action="store_true", help="Don't build; exit 1 if the committed build is stale")
+    args = parser.parse_args()
+    if args.check:
+        problems = check()
+        for problem in problems:
+            print(problem)
+        raise SystemExit(1 if problems else 0)
+    manifest = build(verbose=not args.quiet)
+    print(f"Wrote {len(manifest['files'])} assets to {os.path.relpath(DIST_DIR, ROOT)}")
+
+if __name__ == "__main__":
+    main()
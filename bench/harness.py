@@ -0,0 +1,146 @@
+import contextlib
+import io
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Shared pieces of the benchmark and load-test drivers:
+# pointing the app at the stub upstream, serving it, and timing requests.
+
+def configure_environment(upstream_url: str):
+    """
+    Points every ai_models upstream at the stub server.
+    Must run before the app is imported (base URLs are read at import time).
+    """
+    os.environ["OWM_BASE_URL"] = upstream_url
+    os.environ["WAQI_BASE_URL"] = upstream_url
+    os.environ["NEWS_BASE_URL"] = upstream_url
+    os.environ["GEMINI_BASE_URL"] = upstream_url
+    for key in ("OPENWEATHER_API_KEY", "AQI_API_KEY", "GEMINI_API_KEY"):
+        os.environ[key] = "bench"
+    os.environ["AQI_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="breatheai-bench-"), "aqi.sqlite3")
+    # Real-key quotas would throttle the benchmark itself; QUOTAS_ENABLED=1 measures them
+    os.environ.setdefault("QUOTAS_ENABLED", "0")
+    # All bench traffic comes from one IP; route concurrency limits stay on
+    os.environ.setdefault("CLIENT_RATE_LIMITS", "0")
+
+def load_app():
+    """Imports the Flask app (after configure_environment)."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from backend.app import app
+    return app
+
+def serve_app(app, host="127.0.0.1", port=0, workers=None):
+    """
+    Serves the app in the background. Returns (server, base_url).
+    With `workers`, requests are handled by a fixed-size thread pool (like
+    gunicorn --threads) instead of one thread per connection.
+    """
+    from werkzeug.serving import BaseWSGIServer, make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    if workers:
+        class PooledWSGIServer(BaseWSGIServer):
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+            def process_request(self, request, client_address):
+                self.pool.submit(self._handle, request, client_address)
+
+            def _handle(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        server = PooledWSGIServer(host, port, app)
+    else:
+        server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+def quiet():
+    """Swallows the app's print() output so the JSON report stays clean."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def latency_summary(latencies: list) -> dict:
+    """p50/p95/p99/mean/max in milliseconds."""
+    values = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process (app, stub and driver together)."""
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+def drive(base_url: str, requests_list: list, concurrency: int) -> dict:
+    """
+    Sends every (method, path, json_body) in requests_list with `concurrency` client threads.
+    Returns latencies, status counts, response bytes (decoded and as sent on the
+    wire, which differ for gzipped responses), wall time and process CPU time.
+    """
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    sizes = []
+    wire_sizes = []
+    lock = threading.Lock()
+
+    def send(item):
+        method, path, body = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, base_url + path, json=body, timeout=60)
+            status, size = resp.status_code, len(resp.content)
+            wire = int(resp.headers.get("Content-Length", size))
+        except requests.RequestException:
+            status, size, wire = "error", 0, 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            sizes.append(size)
+            wire_sizes.append(wire)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests_list))
+    wall = time.perf_counter() - start
+
+    return {"latencies": latencies, "statuses": statuses, "sizes": sizes, "wire_sizes": wire_sizes,
+            "wall_s": wall, "cpu_s": time.process_time() - cpu_start}
@@ -0,0 +1,234 @@
+"""
+Load generator with synthetic city traffic, run against stubbed upstreams.
+
+Traffic model:
+  - Cities are Zipf-distributed, with the EMERGENCY_DATA cities at the head.
+  - Each visit is jittered around its city centre (gaussian, --jitter-km).
+  - A per-city AQI random walk drives bursts: when a city crosses --burst-aqi,
+    its traffic is multiplied by --burst-factor for --burst-seconds.
+
+Each worker count runs in a fresh process (cold caches) and the report shows
+cache effectiveness, upstream calls per user request and tail latency.
+
+    python -m bench.loadgen --workers 1 2 4 8 --rate 40 --duration 20 --output load.json
+"""
+import argparse
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import harness
+from bench.run import ADVISORY_BODY
+from bench.stub_server import StubUpstream
+
+# Head of the distribution: the cities with curated emergency data
+CITY_COORDS = {
+    "Mumbai": (19.0760, 72.8777), "Delhi": (28.6139, 77.2090), "Bangalore": (12.9716, 77.5946),
+    "London": (51.5074, -0.1278), "New York": (40.7128, -74.0060), "Singapore": (1.3521, 103.8198),
+    "Dubai": (25.2048, 55.2708), "Sydney": (-33.8688, 151.2093), "Melbourne": (-37.8136, 144.9631),
+    "San Francisco": (37.7749, -122.4194),
+}
+# Long tail
+TAIL_COORDS = {
+    "Pune": (18.5204, 73.8567), "Kolkata": (22.5726, 88.3639), "Chennai": (13.0827, 80.2707),
+    "Hyderabad": (17.3850, 78.4867), "Ahmedabad": (23.0225, 72.5714), "Jaipur": (26.9124, 75.7873),
+    "Lucknow": (26.8467, 80.9462), "Kanpur": (26.4499, 80.3319), "Patna": (25.5941, 85.1376),
+    "Nagpur": (21.1458, 79.0882), "Thane": (19.2183, 72.9781), "Surat": (21.1702, 72.8311),
+    "Indore": (22.7196, 75.8577), "Bhopal": (23.2599, 77.4126), "Chandigarh": (30.7333, 76.7794),
+    "Gurgaon": (28.4595, 77.0266), "Noida": (28.5355, 77.3910), "Ghaziabad": (28.6692, 77.4538),
+    "Paris": (48.8566, 2.3522), "Tokyo": (35.6762, 139.6503), "Beijing": (39.9042, 116.4074),
+    "Dhaka": (23.8103, 90.4125), "Lahore": (31.5204, 74.3587), "Karachi": (24.8607, 67.0011),
+    "Jakarta": (-6.2088, 106.8456), "Bangkok": (13.7563, 100.5018), "Cairo": (30.0444, 31.2357),
+    "Los Angeles": (34.0522, -118.2437), "Mexico City": (19.4326, -99.1332), "Sao Paulo": (-23.5505, -46.6333),
+}
+
+KM_PER_DEGREE = 111.0
+
+def city_weights(exponent: float) -> list:
+    """[(city, (lat, lon), weight)] with Zipf weights 1/rank^s."""
+    try:
+        from data.emergency_data import EMERGENCY_DATA
+        head = [c for c in EMERGENCY_DATA if c in CITY_COORDS]
+    except ImportError:
+        head = list(CITY_COORDS)
+    cities = [(c, CITY_COORDS[c]) for c in head] + list(TAIL_COORDS.items())
+    return [(name, coords, 1.0 / (rank ** exponent)) for rank, (name, coords) in enumerate(cities, start=1)]
+
+def build_schedule(args) -> list:
+    """
+    Open-loop arrival schedule: [(offset_s, city, lat, lon)].
+    Base traffic is Poisson at --rate visits/s, plus burst traffic for cities over threshold.
+    """
+    rng = random.Random(args.seed)
+    cities = city_weights(args.zipf)
+    names = [c[0] for c in cities]
+    weights = [c[2] for c in cities]
+    total_weight = sum(weights)
+
+    # Per-city AQI random walk, sampled once per second
+    aqi = {name: rng.uniform(40, 170) for name in names}
+    burst_until = {}
+
+    schedule = []
+    for second in range(args.duration):
+        for name in names:
+            before = aqi[name]
+            aqi[name] = max(0.0, before + rng.gauss(0, args.aqi_volatility))
+            if before < args.burst_aqi <= aqi[name]:
+                burst_until[name] = second + args.burst_seconds
+
+        rates = {name: args.rate * w / total_weight for name, w in zip(names, weights)}
+        for name, until in burst_until.items():
+            if second < until:
+                rates[name] *= args.burst_factor
+
+        for (name, (lat, lon), _), rate in zip(cities, rates.values()):
+            t = 0.0
+            while True:
+                t += rng.expovariate(rate) if rate > 0 else 2.0
+                if t >= 1.0:
+                    break
+                jitter_lat = rng.gauss(0, args.jitter_km) / KM_PER_DEGREE
+                jitter_lon = rng.gauss(0, args.jitter_km) / (KM_PER_DEGREE * max(0.1, math.cos(math.radians(lat))))
+                schedule.append((second + t, name, lat + jitter_lat, lon + jitter_lon))
+
+    schedule.sort()
+    return schedule
+
+def visit_requests(mix: str, city: str, lat: float, lon: float) -> list:
+    """Requests one dashboard visit makes: the environment call, plus the follow-ups in 'visit' mode."""
+    reqs = [("environment", "GET", f"/api/environment/{lat:.4f}/{lon:.4f}", None)]
+    if mix == "visit":
+        reqs += [
+            ("news", "GET", f"/api/news/{city}", None),
+            ("support", "GET", f"/api/support?city={city}&country=", None),
+            ("advisory", "POST", "/api/advisory", dict(ADVISORY_BODY, city=city, lat=lat, lon=lon)),
+        ]
+    return reqs
+
+def run_single(args) -> dict:
+    """One load run at a fixed server worker count (called in a fresh process)."""
+    stub = StubUpstream(latency_ms=args.latency_ms, error_rate=args.error_rate, seed=args.seed)
+    harness.configure_environment(stub.start())
+    app = harness.load_app()
+    server, base_url = harness.serve_app(app, workers=args.single_run)
+    from ai_models import metrics
+
+    schedule = build_schedule(args)
+    latencies = {}
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def visit(item):
+        scheduled_at, city, lat, lon = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        for route, method, path, body in visit_requests(args.mix, city, lat, lon):
+            try:
+                status = session.request(method, base_url + path, json=body, timeout=120).status_code
+            except requests.RequestException:
+                status = "error"
+            # Measured from the scheduled arrival, so queueing delay counts (no coordinated omission)
+            elapsed = time.perf_counter() - scheduled_at
+            with lock:
+                latencies.setdefault(route, []).append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            scheduled_at = time.perf_counter()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for offset, city, lat, lon in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(visit, (start + offset, city, lat, lon))
+    wall = time.perf_counter() - start
+    server.shutdown()
+    stub.stop()
+
+    user_requests = sum(len(v) for v in latencies.values())
+    upstream_calls = sum(stub.counts.values())
+    cache = {}
+    for labels, value in metrics.snapshot().get("breatheai_cache_requests_total", {}).items():
+        d = dict(labels)
+        entry = cache.setdefault(d["cache"], {"hit": 0, "miss": 0})
+        entry[d["result"]] += value
+    for entry in cache.values():
+        total = entry["hit"] + entry["miss"]
+        entry["hit_ratio"] = round(entry["hit"] / total, 3) if total else 0.0
+
+    all_latencies = [l for v in latencies.values() for l in v]
+    return {
+        "workers": args.single_run,
+        "visits": len(schedule),
+        "user_requests": user_requests,
+        "throughput_rps": round(user_requests / wall, 2) if wall else 0.0,
+        "latency": harness.latency_summary(all_latencies),
+        "latency_by_route": {route: harness.latency_summary(v) for route, v in latencies.items()},
+        "statuses": statuses,
+        "cache": cache,
+        "upstream_calls": {p: c for p, c in stub.counts.items() if c},
+        "upstream_amplification": round(upstream_calls / user_requests, 3) if user_requests else 0.0,
+        "peak_rss_mb": harness.peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="BreatheAI load test with synthetic city traffic.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Server worker counts to compare")
+    parser.add_argument("--rate", type=float, default=20, help="Base visits per second")
+    parser.add_argument("--duration", type=int, default=15, help="Seconds of traffic per run")
+    parser.add_argument("--mix", choices=["visit", "environment"], default="visit")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent over cities")
+    parser.add_argument("--jitter-km", type=float, default=5.0)
+    parser.add_argument("--burst-aqi", type=float, default=150, help="AQI threshold that triggers a burst")
+    parser.add_argument("--burst-factor", type=float, default=5.0)
+    parser.add_argument("--burst-seconds", type=int, default=5)
+    parser.add_argument("--aqi-volatility", type=float, default=8.0, help="Std-dev of the per-second AQI walk")
+    parser.add_argument("--clients", type=int, default=256, help="Max concurrent client visits")
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--single-run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_run:
+        with harness.quiet():
+            result = run_single(args)
+        print(json.dumps(result))
+        return
+
+    # Each worker count runs in its own process so caches and the store start cold
+    passthrough = []
+    for key, value in vars(args).items():
+        if key not in ("workers", "output", "single_run"):
+            passthrough += [f"--{key.replace('_', '-')}", str(value)]
+
+    runs = []
+    for workers in args.workers:
+        out = subprocess.check_output([sys.executable, "-m", "bench.loadgen", *passthrough, "--single-run", str(workers)],
+                                      cwd=harness.ROOT, text=True)
+        run = json.loads(out.strip().splitlines()[-1])
+        runs.append(run)
+        print(f"workers={workers:<3} rps={run['throughput_rps']:<8} p50={run['latency']['p50_ms']}ms "
+              f"p99={run['latency']['p99_ms']}ms amplification={run['upstream_amplification']}", file=sys.stderr)
+
+    report = {"meta": {k: v for k, v in vars(args).items() if k not in ("output", "single_run")}, "runs": runs}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Records fresh upstream responses into bench/fixtures using the real API keys in .env.
+
+    python -m bench.record_fixtures --lat 19.076 --lon 72.8777 --city Mumbai
+"""
+import argparse
+import json
+import os
+import time
+from urllib.parse import quote
+
+import requests
+
+import ai_models  # noqa: F401  (loads .env)
+from bench.stub_server import FIXTURES_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description="Record upstream API responses as benchmark fixtures.")
+    parser.add_argument("--lat", type=float, default=19.076)
+    parser.add_argument("--lon", type=float, default=72.8777)
+    parser.add_argument("--city", default="Mumbai")
+    args = parser.parse_args()
+
+    owm = os.getenv("OPENWEATHER_API_KEY")
+    waqi = os.getenv("AQI_API_KEY")
+    lat, lon = args.lat, args.lon
+    now = int(time.time()) // 3600 * 3600
+
+    urls = {
+        "owm_weather.json": f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={owm}&units=metric",
+        "owm_air_pollution.json": f"https://api.openweathermap.org/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={owm}",
+        "owm_forecast.json": f"https://api.openweathermap.org/data/2.5/air_pollution/forecast?lat={lat}&lon={lon}&appid={owm}",
+        "owm_history.json": f"https://api.openweathermap.org/data/2.5/air_pollution/history?lat={lat}&lon={lon}&start={now - 7 * 86400}&end={now}&appid={owm}",
+        "owm_geocode.json": f"https://api.openweathermap.org/geo/1.0/direct?q={quote(args.city)}&limit=5&appid={owm}",
+        "waqi_feed.json": f"https://api.waqi.info/feed/geo:{lat};{lon}/?token={waqi}",
+        "waqi_bounds.json": f"https://api.waqi.info/map/bounds?latlng={lat - 0.5},{lon - 0.5},{lat + 0.5},{lon + 0.5}&token={waqi}",
+        "google_news.xml": f"https://news.google.com/rss/search?q={quote(args.city + ' air pollution air quality')}&hl=en-IN&gl=IN&ceid=IN:en",
+    }
+
+    for name, url in urls.items():
+        response = requests.get(url, timeout=15)
+        response.raise_for_status()
+        with open(os.path.join(FIXTURES_DIR, name), "wb") as f:
+            f.write(response.content)
+        print(f"Recorded {name} ({len(response.content)} bytes)")
+
+    # Gemini fixtures are kept as-is: recording them costs quota and they vary per call
+    with open(os.path.join(FIXTURES_DIR, "meta.json"), "w") as f:
+        json.dump({"recorded_at": now, "location": {"lat": lat, "lon": lon, "city": args.city}}, f, indent=1)
+
+if __name__ == "__main__":
+    main()
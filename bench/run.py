@@ -0,0 +1,190 @@
+"""
+Offline benchmark for the BreatheAI API.
+
+Replays recorded upstream responses (bench/fixtures) through a local stub
+server, drives the Flask app at a given concurrency and writes a JSON report.
+
+    python -m bench.run --requests 200 --concurrency 8 --latency-ms 80 --output results.json
+    python -m bench.run --cache cold --compare results.json
+    python -m bench.run --json stdlib --output stdlib.json   # compare with the default (orjson)
+
+cpu_ms_per_request is CPU time of the whole bench process (app, stub server
+and client threads), so compare it between runs rather than reading it alone.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from bench import harness
+from bench.stub_server import StubUpstream
+
+# Body for /api/advisory, shaped like the "environment" block the dashboard posts
+ADVISORY_BODY = {
+    "temperature": 31.99, "humidity": 62, "description": "haze", "icon": "50d",
+    "city": "Mumbai", "country": "IN", "aqi": 158, "lat": 19.076, "lon": 72.8777,
+    "pollutants": {"PM2.5": {"concentration": 158}, "PM10": {"concentration": 92}, "NO2": {"concentration": 11.2},
+                   "SO2": {"concentration": 4.1}, "O3": {"concentration": 18.4}, "CO": {"concentration": 7.3}},
+}
+
+ROUTES = ["environment", "advisory", "news", "geocode", "support"]
+
+def build_requests(route: str, count: int, cache_mode: str) -> list:
+    """
+    Request list for one route. In 'cold' mode every request uses a distinct
+    location so nothing is served from the server-side caches.
+    """
+    items = []
+    for i in range(count):
+        cold = cache_mode == "cold"
+        if route == "environment":
+            lat, lon = (19.076 + i * 0.2, 72.8777) if cold else (19.076, 72.8777)
+            items.append(("GET", f"/api/environment/{lat:.4f}/{lon:.4f}", None))
+        elif route == "advisory":
+            items.append(("POST", "/api/advisory", dict(ADVISORY_BODY, aqi=ADVISORY_BODY["aqi"] + (i if cold else 0))))
+        elif route == "news":
+            items.append(("GET", f"/api/news/Mumbai{i if cold else ''}", None))
+        elif route == "geocode":
+            items.append(("GET", f"/api/geocode?city=Mumbai{i if cold else ''}", None))
+        elif route == "support":
+            # Unknown cities fall through to the Gemini lookup
+            city = f"Town{i}" if cold else "Mumbai"
+            items.append(("GET", f"/api/support?city={city}&country=ZZ", None))
+    return items
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=harness.ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def run(args) -> dict:
+    stub = StubUpstream(latency_ms=args.latency_ms, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    harness.configure_environment(stub.start())
+    if args.json == "stdlib":
+        os.environ["FAST_JSON"] = "0"
+    if args.tracemalloc:
+        tracemalloc.start()
+    app = harness.load_app()
+    from ai_models import fastjson
+    server, base_url = harness.serve_app(app)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "cache": args.cache,
+            "json_encoder": fastjson.ENCODER,
+        },
+        "routes": {},
+    }
+
+    try:
+        for route in args.routes:
+            stub.reset_counts()
+            result = harness.drive(base_url, build_requests(route, args.requests, args.cache), args.concurrency)
+            n = len(result["latencies"])
+            report["routes"][route] = {
+                "requests": n,
+                "throughput_rps": round(n / result["wall_s"], 2) if result["wall_s"] else 0.0,
+                **harness.latency_summary(result["latencies"]),
+                "statuses": {str(k): v for k, v in result["statuses"].items()},
+                "mean_response_bytes": int(sum(result["sizes"]) / n) if n else 0,
+                "mean_wire_bytes": int(sum(result["wire_sizes"]) / n) if n else 0,
+                "cpu_ms_per_request": round(result["cpu_s"] * 1000 / n, 3) if n else 0.0,
+                "upstream_calls": {p: c for p, c in stub.counts.items() if c},
+            }
+        report["serialization"] = serialization_costs(sys.modules["backend.app"].CACHE)
+    finally:
+        server.shutdown()
+        stub.stop()
+
+    report["memory"] = {"peak_rss_mb": harness.peak_rss_mb()}
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        report["memory"]["python_heap_peak_mb"] = round(peak / (1024 * 1024), 2)
+        tracemalloc.stop()
+    return report
+
+def serialization_costs(cache: dict, repeat: int = 200) -> dict:
+    """
+    Per cache kind, microseconds to encode one cached payload with the stdlib
+    json module (what every cache hit used to cost) and with fastjson, next to
+    the bytes a hit now sends as-is, plus the size of the stored gzip copy.
+    """
+    from ai_models import fastjson
+    costs = {}
+    for key, entry in list(cache.items()):
+        kind = key.split("_", 1)[0]
+        if kind in costs or "body" not in entry:
+            continue
+        timings = {}
+        for name, encode in (("stdlib_us", lambda d: json.dumps(d, sort_keys=True, default=str).encode()),
+                             ("fastjson_us", fastjson.dumps)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                encode(entry["data"])
+            timings[name] = round((time.perf_counter() - start) * 1e6 / repeat, 1)
+        costs[kind] = {**timings, "bytes": len(entry["body"]),
+                       "gzip_bytes": len(entry["gzip"]) if entry["gzip"] is not None else None}
+    return costs
+
+def compare(old: dict, new: dict) -> str:
+    """Side-by-side table of two reports (throughput and tail latency)."""
+    lines = [f"{'route':<12} {'rps old':>9} {'rps new':>9} {'p50 old':>9} {'p50 new':>9} {'p99 old':>9} {'p99 new':>9}"
+             f" {'cpu old':>9} {'cpu new':>9} {'wire old':>9} {'wire new':>9}"]
+    for route, cur in new["routes"].items():
+        prev = old.get("routes", {}).get(route)
+        if not prev:
+            continue
+        lines.append(f"{route:<12} {prev['throughput_rps']:>9} {cur['throughput_rps']:>9} "
+                     f"{prev['p50_ms']:>9} {cur['p50_ms']:>9} {prev['p99_ms']:>9} {cur['p99_ms']:>9} "
+                     f"{prev.get('cpu_ms_per_request', '-'):>9} {cur['cpu_ms_per_request']:>9} "
+                     f"{prev.get('mean_wire_bytes', '-'):>9} {cur['mean_wire_bytes']:>9}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline BreatheAI API benchmark.")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=ROUTES)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", choices=["warm", "cold"], default="warm")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean stub upstream latency")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls answered with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", choices=["fast", "stdlib"], default="fast",
+                        help="JSON encoder: orjson when installed (fast) or the json module (stdlib)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python heap peak (slower)")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's log output")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    if args.verbose:
+        report = run(args)
+    else:
+        with harness.quiet():
+            report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report))
+
+if __name__ == "__main__":
+    main()
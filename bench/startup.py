@@ -0,0 +1,114 @@
+"""
+Cold-start profile for the serverless entry point (backend/app.py).
+
+Imports the app in fresh interpreters under `-X importtime`, reports where
+the time goes and fails (exit 1) when the import exceeds the budget or pulls
+in a module that is meant to load only on first use.
+
+    python -m bench.startup --runs 7 --budget-ms 250
+    python -m bench.startup --output startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from bench import harness
+
+# Heavy modules the app must not import at startup (each is loaded by the route that needs it)
+DEFERRED_MODULES = (
+    "asyncio", "sqlite3", "requests", "httpx", "xml.etree.ElementTree",
+    "google.generativeai", "numpy",
+)
+
+# Runs in the child: times the import, then reports deferred modules that got
+# loaded and project modules compiled from source (missing or stale .pyc).
+CHILD = """
+import importlib.util, json, os, sys, time
+start = time.perf_counter()
+import backend.app
+elapsed = time.perf_counter() - start
+root = os.getcwd()
+stale = []
+for name, module in list(sys.modules.items()):
+    path = getattr(module, "__file__", None) or ""
+    if path.startswith(root) and path.endswith(".py"):
+        cached = importlib.util.cache_from_source(path)
+        if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+            stale.append(name)
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "deferred_loaded": [m for m in %r if m in sys.modules],
+    "stale_bytecode": sorted(stale),
+}))
+""" % (DEFERRED_MODULES,)
+
+def parse_importtime(stderr: str) -> list:
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def profile_once() -> tuple:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                          cwd=harness.ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile BreatheAI cold start (app import time).")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--budget-ms", type=float, default=250, help="Fail if the median import takes longer")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list by self time")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    runs = [profile_once() for _ in range(args.runs)]
+    import_ms = [r[0]["import_ms"] for r in runs]
+    result, rows = runs[-1]
+
+    # Top-level packages by total self time, plus the project's own modules
+    packages = {}
+    for name, self_us, _, _ in rows:
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    own = {name: round(cum / 1000, 2) for name, _, cum, _ in rows if name.split(".")[0] in ("ai_models", "backend")}
+
+    median = statistics.median(import_ms)
+    report = {
+        "import_ms": {"median": round(median, 1), "min": round(min(import_ms), 1), "max": round(max(import_ms), 1)},
+        "budget_ms": args.budget_ms,
+        "within_budget": median <= args.budget_ms,
+        "deferred_loaded": result["deferred_loaded"],
+        "stale_bytecode": result["stale_bytecode"],
+        "project_modules_ms": own,
+        "packages_self_ms": {p: round(us / 1000, 2) for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]},
+        "modules_self_ms": {n: round(s / 1000, 2) for n, s, _, _ in sorted(rows, key=lambda r: -r[1])[:args.top]},
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    problems = []
+    if not report["within_budget"]:
+        problems.append(f"median import {median:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+    if result["deferred_loaded"]:
+        problems.append(f"loaded at startup: {', '.join(result['deferred_loaded'])}")
+    if result["stale_bytecode"]:
+        print(f"note: {len(result['stale_bytecode'])} project modules compiled from source; "
+              f"run `python -m compileall -q ai_models backend` at build time", file=sys.stderr)
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for OWM, WAQI, Google News and Gemini.
+# Replays the recorded responses in bench/fixtures with configurable latency
+# and error injection, and counts calls per provider.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# (method, path pattern, provider, fixture)
+ROUTES = [
+    ("GET", re.compile(r"^/data/2\.5/weather$"), "owm_weather", "owm_weather.json"),
+    ("GET", re.compile(r"^/data/2\.5/air_pollution$"), "owm_pollution", "owm_air_pollution.json"),
+    ("GET", re.compile(r"^/data/2\.5/air_pollution/forecast$"), "owm_forecast", "owm_forecast.json"),
+    ("GET", re.compile(r"^/data/2\.5/air_pollution/history$"), "owm_history", "owm_history.json"),
+    ("GET", re.compile(r"^/geo/1\.0/direct$"), "owm_geocode", "owm_geocode.json"),
+    ("GET", re.compile(r"^/feed/geo:"), "waqi", "waqi_feed.json"),
+    ("GET", re.compile(r"^/map/bounds$"), "waqi_bounds", "waqi_bounds.json"),
+    ("GET", re.compile(r"^/rss/search$"), "google_news", "google_news.xml"),
+    ("POST", re.compile(r":generateContent$"), "gemini", None),  # Picked from the prompt, see _gemini_fixture
+]
+
+PROVIDERS = [r[2] for r in ROUTES]
+
+def _load(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        raw = f.read()
+    return json.loads(raw) if name.endswith(".json") else raw
+
+class StubUpstream:
+    """
+    Threaded HTTP server replaying fixtures.
+
+    latency_ms: mean added latency, a number for every provider or a {provider: ms} dict.
+    jitter: +/- fraction applied to the latency.
+    error_rate: probability (0-1) of answering 503, a number or {provider: rate} dict.
+    """
+
+    def __init__(self, latency_ms=0, jitter=0.2, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.counts = {p: 0 for p in PROVIDERS}
+        self.errors = {p: 0 for p in PROVIDERS}
+        self._lock = threading.Lock()
+        self.meta = _load("meta.json")
+        self.fixtures = {r[3]: _load(r[3]) for r in ROUTES if r[3]}
+        self.fixtures["gemini_advice.json"] = _load("gemini_advice.json")
+        self.fixtures["gemini_emergency.json"] = _load("gemini_emergency.json")
+        self.server = None
+
+    def start(self, host="127.0.0.1", port=0) -> str:
+        """Starts serving in a background thread and returns the base URL."""
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {p: 0 for p in PROVIDERS}
+            self.errors = {p: 0 for p in PROVIDERS}
+
+    def _setting(self, value, provider):
+        return value.get(provider, 0) if isinstance(value, dict) else value
+
+    def delay(self, provider) -> float:
+        ms = self._setting(self.latency_ms, provider)
+        if not ms:
+            return 0
+        with self._lock:
+            return ms / 1000.0 * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self, provider) -> bool:
+        rate = self._setting(self.error_rate, provider)
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def count(self, provider, failed):
+        with self._lock:
+            self.counts[provider] += 1
+            if failed:
+                self.errors[provider] += 1
+
+    def respond(self, provider, fixture, query, body):
+        """Returns (content_type, bytes) for a fixture, shifted to the current time."""
+        if provider == "gemini":
+            name = "gemini_emergency.json" if b"emergency contact" in body else "gemini_advice.json"
+            return "application/json", json.dumps(self.fixtures[name]).encode()
+
+        data = self.fixtures[fixture]
+        if isinstance(data, bytes):
+            return "application/rss+xml; charset=utf-8", data
+
+        if provider == "waqi_bounds":
+            # Only the stations inside the requested box
+            south, west, north, east = (float(v) for v in query.get("latlng", ["-90,-180,90,180"])[0].split(","))
+            stations = [s for s in data["data"] if south <= s["lat"] <= north and west <= s["lon"] <= east]
+            return "application/json", json.dumps(dict(data, data=stations)).encode()
+
+        # Recorded timestamps are moved so "now" in the recording is now
+        offset = int(time.time()) // 3600 * 3600 - self.meta["recorded_at"]
+        if isinstance(data, dict) and "list" in data:
+            items = [dict(item, dt=item["dt"] + offset) for item in data["list"]]
+            if provider == "owm_history":
+                start = int(query.get("start", ["0"])[0])
+                end = int(query.get("end", [str(2 ** 40)])[0])
+                items = [i for i in items if start <= i["dt"] <= end]
+            data = dict(data, list=items)
+        elif isinstance(data, dict) and "dt" in data:
+            data = dict(data, dt=data["dt"] + offset)
+        return "application/json", json.dumps(data).encode()
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self, method):
+            parsed = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+
+            for route_method, pattern, provider, fixture in ROUTES:
+                if route_method == method and pattern.search(parsed.path):
+                    break
+            else:
+                return self._send(404, "application/json", b'{"error": "no fixture"}')
+
+            time.sleep(stub.delay(provider))
+            failed = stub.should_fail(provider)
+            stub.count(provider, failed)
+            if failed:
+                return self._send(503, "application/json", b'{"error": "injected failure"}')
+            content_type, payload = stub.respond(provider, fixture, parse_qs(parsed.query), body)
+            self._send(200, content_type, payload)
+
+        def _send(self, status, content_type, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve recorded upstream fixtures locally.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+    stub = StubUpstream(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    print(f"Stub upstream on {stub.start(port=args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()